@@ -1,10 +1,30 @@
 from django.contrib import admin
-from .models import ProfileYoutube, PlaylistYoutube, VideoYoutube, ImportToolProxy, DashboardProxy
+from .models import ProfileYoutube, PlaylistYoutube, VideoYoutube, JobRun, KeywordResult, ImportToolProxy, DashboardProxy
 from whiteneuron.base.admin import ModelAdmin, base_admin_site, TabularInline
+from .stats import invalidate_totals
+from .youtube_ids import extract_playlist_id, extract_video_id
 
 # Register your models here.
 
 
+class ExactIdSearchMixin:
+    """
+    Từ khoá là ID/link YouTube thì tra chính xác theo cột ID (có index) thay vì icontains trên link.
+    Lớp con khai báo exact_id_field và exact_id_extractor (hàm tách ID từ link).
+    """
+    exact_id_field = None
+    exact_id_extractor = None
+
+    def get_search_results(self, request, queryset, search_term):
+        youtube_id = self.exact_id_extractor(search_term)
+        if youtube_id:
+            matches = queryset.filter(**{self.exact_id_field: youtube_id})
+            # Từ khoá trông giống ID nhưng có thể là tên; không khớp ID nào thì tìm như bình thường
+            if search_term.strip() != youtube_id or matches.exists():
+                return matches, False
+        return super().get_search_results(request, queryset, search_term)
+
+
 class PlaylistYoutubeInline(TabularInline):
     model = PlaylistYoutube
     tab = True
@@ -42,31 +62,83 @@ class ProfileYoutubeAdmin(ModelAdmin):
     )
 
 @admin.register(PlaylistYoutube, site=base_admin_site)
-class PlaylistYoutubeAdmin(ModelAdmin):
+class PlaylistYoutubeAdmin(ExactIdSearchMixin, ModelAdmin):
     list_display = ['name', 'profile', 'youtube_link']
     search_fields = ['name', 'youtube_link', 'profile__name', 'profile__gpm_id']
     list_filter = ['profile']
     autocomplete_fields = ['profile']
-    readonly_fields = ['youtube_link','name','profile','number_of_videos']
+    readonly_fields = ['youtube_link', 'playlist_id', 'name', 'profile', 'number_of_videos']
+    exact_id_field = 'playlist_id'
+    exact_id_extractor = staticmethod(extract_playlist_id)
     fieldsets = (
         ('Cơ bản', {
-            'fields': ('profile', 'name', 'youtube_link', 'number_of_videos')
+            'fields': ('profile', 'name', 'youtube_link', 'playlist_id', 'number_of_videos')
         }),
     )
 
 @admin.register(VideoYoutube, site=base_admin_site)
-class VideoYoutubeAdmin(ModelAdmin):
-    list_display = ['youtube_link', 'playlist', 'created_at']
+class VideoYoutubeAdmin(ExactIdSearchMixin, ModelAdmin):
+    list_display = ['youtube_link', 'video_id', 'playlist', 'created_at']
     search_fields = ['youtube_link', 'playlist__name', 'playlist__profile__name']
     list_filter = ['playlist', 'created_at']
     autocomplete_fields = ['playlist']
+    readonly_fields = ['video_id']
+    exact_id_field = 'video_id'
+    exact_id_extractor = staticmethod(extract_video_id)
+
+    fieldsets = (
+        ('Cơ bản', {
+            'fields': ('playlist', 'youtube_link', 'video_id')
+        }),
+    )
+
+    # Xoá video không phát signal (giữ fast-delete), nên tự xoá counter tổng video
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_totals(VideoYoutube)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_totals(VideoYoutube)
 
+
+@admin.register(JobRun, site=base_admin_site)
+class JobRunAdmin(ModelAdmin):
+    list_display = ['job_id', 'profile_id', 'name', 'keyword', 'status', 'priority', 'attempts', 'worker', 'started_at', 'finished_at']
+    search_fields = ['job_id', 'session_id', 'profile_id', 'name', 'keyword']
+    list_filter = ['status', 'error_class', 'created_at']
+    readonly_fields = [
+        'job_id', 'session_id', 'profile_id', 'name', 'keyword', 'payload', 'status', 'priority', 'error',
+        'error_class', 'attempts', 'next_run_at', 'created_by',
+        'step', 'checkpoint', 'timings', 'logs', 'worker', 'locked_until', 'started_at', 'finished_at',
+    ]
     fieldsets = (
         ('Cơ bản', {
-            'fields': ('playlist', 'youtube_link')
+            'fields': ('job_id', 'session_id', 'profile_id', 'name', 'keyword', 'status', 'priority', 'error',
+                       'error_class', 'attempts', 'next_run_at', 'created_by')
+        }),
+        ('Chi tiết', {
+            'fields': ('payload', 'step', 'checkpoint', 'timings', 'worker', 'locked_until', 'started_at', 'finished_at')
+        }),
+        ('Log', {
+            'fields': ('logs',)
         }),
     )
 
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(KeywordResult, site=base_admin_site)
+class KeywordResultAdmin(ModelAdmin):
+    list_display = ['keyword', 'locale', 'runs', 'refreshed_at']
+    search_fields = ['keyword']
+    list_filter = ['locale', 'refreshed_at']
+    readonly_fields = ['keyword', 'locale', 'video_ids', 'runs', 'refreshed_at']
+
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(ImportToolProxy, site=base_admin_site)
 class ImportToolProxyAdmin(ModelAdmin):
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class YoutubeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.youtube'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from tools.job_logging import setup_logging
+
+        setup_logging()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from tools.gpm_client import GPMError, gpm
+
+logger = logging.getLogger(__name__)
+
+GPM_PROFILES_CACHE_KEY = "gpm_profiles"
+GPM_PROFILES_REFRESH_LOCK = "gpm_profiles_refreshing"
+# Bản cũ vẫn được trả về trong lúc làm mới ngầm, tối đa STALE_FACTOR lần TTL
+STALE_FACTOR = 10
+REFRESH_LOCK_TIMEOUT = 60
+
+
+def _ttl() -> int:
+    return getattr(settings, "GPM_PROFILES_CACHE_TTL", 60)
+
+
+def fetch_gpm_profiles() -> dict:
+    """
+    Gọi GPM lấy toàn bộ danh sách profile, lưu vào cache kèm hash nội dung.
+    Trả về entry {"data", "etag", "fetched_at"}.
+    """
+    resp = gpm.list_profiles()
+    if not isinstance(resp, dict) or not isinstance(resp.get("data"), list):
+        raise GPMError("Dữ liệu GPM không hợp lệ")
+
+    data = resp["data"]
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    entry = {"data": data, "etag": digest, "fetched_at": time.time()}
+    cache.set(GPM_PROFILES_CACHE_KEY, entry, timeout=_ttl() * STALE_FACTOR)
+    return entry
+
+
+def _refresh_in_background():
+    # cache.add đóng vai trò khoá: chỉ 1 request kích hoạt làm mới tại một thời điểm
+    if not cache.add(GPM_PROFILES_REFRESH_LOCK, 1, timeout=REFRESH_LOCK_TIMEOUT):
+        return
+
+    def refresh():
+        try:
+            fetch_gpm_profiles()
+        except GPMError as e:
+            logger.warning("⚠️ Không làm mới được danh sách profile GPM: %s", e)
+        finally:
+            cache.delete(GPM_PROFILES_REFRESH_LOCK)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def get_gpm_profiles(force_refresh: bool = False) -> dict:
+    """
+    Lấy danh sách profile GPM từ cache.
+    Chưa có trong cache (hoặc force_refresh) thì gọi GPM trực tiếp; đã quá TTL thì trả bản
+    đang có và làm mới ngầm để không bắt người dùng chờ GPM.
+    """
+    entry = None if force_refresh else cache.get(GPM_PROFILES_CACHE_KEY)
+    if entry is None:
+        return fetch_gpm_profiles()
+    if time.time() - entry["fetched_at"] > _ttl():
+        _refresh_in_background()
+    return entry
+
+
+def filter_profiles(profiles: list, query: str = "") -> list:
+    """Lọc profile theo id/tên (không phân biệt hoa thường)."""
+    query = query.strip().lower()
+    if not query:
+        return profiles
+    return [
+        item for item in profiles
+        if query in str(item.get("name", "")).lower() or query in str(item.get("id", "")).lower()
+    ]
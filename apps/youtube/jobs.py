@@ -0,0 +1,565 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.conf import settings
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from tools.admission import admission
+from tools.auto_add_playlists import TOTAL_STEPS, BrowserSession, StepTimer, run_for_profile
+from tools.errors import error_class, is_transient
+from tools.job_logging import job_logging
+from tools.metrics import JOBS_FINISHED, JOBS_QUEUED, JOBS_RETRIED, JOBS_RUNNING, JOBS_STARTED, QUEUE_WAIT
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+# Các field trả về cho trang theo dõi job
+JOB_STATE_FIELDS = ("status", "profile_id", "keyword", "name", "error", "step")
+# Chu kỳ (giây) ghi gộp tiến độ các job xuống DB
+PROGRESS_FLUSH_INTERVAL = 1.0
+# Thời gian worker được giữ job, gia hạn mỗi JOB_HEARTBEAT_INTERVAL giây khi process còn sống;
+# quá hạn (worker bị kill) thì worker khác được nhận lại
+JOB_LEASE = timedelta(minutes=2)
+JOB_HEARTBEAT_INTERVAL = JOB_LEASE.total_seconds() / 4
+CLAIM_BATCH_SIZE = 10
+# Priority: job chạy tay cho 1 profile được nhận trước job của sheet import
+PRIORITY_BULK = 0
+PRIORITY_INTERACTIVE = 10
+# Số session xét mỗi lần nhận job (theo thứ tự fair share)
+CLAIM_SESSION_LIMIT = 5
+# Giữ trình duyệt mở thêm bao lâu để chờ job tiếp theo của cùng profile
+SESSION_IDLE_TIMEOUT = 10
+# Job lỗi tạm thời được chạy tối đa MAX_ATTEMPTS lần, lần sau cách lần trước theo backoff (giây)
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 30
+RETRY_BACKOFF_MAX = 600
+# Tổng số lần thử lại của 1 session: tối đa 20% số job (ít nhất 3), tránh import lỗi hàng loạt chạy mãi
+SESSION_RETRY_RATIO = 0.2
+SESSION_RETRY_MIN = 3
+# Lỗi DB khi nhận job (vd. "database is locked"): chờ lâu dần tới tối đa chừng này giây rồi thử lại
+CLAIM_ERROR_BACKOFF_MAX = 30
+# Job đã bấm tạo playlist thì không chạy lại (chạy lại từ đầu sẽ tạo thêm 1 playlist trùng)
+PLAYLIST_CREATED_CHECKPOINT = "playlist_created"
+
+# Profile đang có phiên trình duyệt mở trong process này
+_ACTIVE_PROFILES = set()
+_ACTIVE_PROFILES_LOCK = threading.Lock()
+
+
+def _job_state(job_run):
+    return {field: getattr(job_run, field) for field in JOB_STATE_FIELDS}
+
+
+class _ProgressWriter:
+    """
+    Gom cập nhật tiến độ (step/checkpoint) của mọi job trong process, ghi bằng 1 bulk_update
+    mỗi PROGRESS_FLUSH_INTERVAL giây thay vì 1 UPDATE cho mỗi bước của mỗi job.
+    Thay đổi status (nhận/kết thúc job) vẫn ghi ngay.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, job_run):
+        with self._lock:
+            self._pending[job_run.pk] = job_run
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-progress-writer", daemon=True)
+                self._thread.start()
+
+    def discard(self, job_run):
+        """Bỏ cập nhật đang chờ của job (dùng khi job được ghi đầy đủ ngay sau đó)."""
+        with self._lock:
+            self._pending.pop(job_run.pk, None)
+
+    def flush(self):
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending.clear()
+        if batch:
+            JobRun.objects.bulk_update(batch, ["step", "checkpoint", "updated_at"], batch_size=500)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval or PROGRESS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("⚠️ Lỗi ghi tiến độ job")
+            finally:
+                close_old_connections()
+
+
+_progress_writer = _ProgressWriter()
+
+
+class _JobLeaseKeeper:
+    """Gia hạn locked_until của các job process này đang giữ (kể cả job đang chờ lease profile)."""
+
+    def __init__(self):
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, job_run):
+        with self._lock:
+            self._jobs.add(job_run.pk)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-lease-heartbeat", daemon=True)
+                self._thread.start()
+
+    def discard(self, job_run):
+        with self._lock:
+            self._jobs.discard(job_run.pk)
+
+    def renew(self):
+        with self._lock:
+            job_pks = list(self._jobs)
+        if job_pks:
+            JobRun.objects.filter(pk__in=job_pks, status=JobRun.Status.RUNNING).update(
+                locked_until=timezone.now() + JOB_LEASE
+            )
+
+    def _run(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                self.renew()
+            except Exception as e:
+                logger.warning("⚠️ Lỗi gia hạn lease job: %s", str(e).split("\n")[0])
+            finally:
+                close_old_connections()
+
+
+_job_leases = _JobLeaseKeeper()
+
+
+def _report_step(job_run, step, label):
+    """Ghi tiến độ từng bước của job (DB để các process khác, kể cả stream SSE, đọc được)."""
+    job_run.step = f"{step}/{TOTAL_STEPS} {label}"
+    job_run.updated_at = timezone.now()
+    _progress_writer.add(job_run)
+
+
+def _save_checkpoint(job_run, name, data):
+    """Lưu checkpoint của job để biết job đã tới đâu (và chạy lại từ đó khi bước sau lỗi)."""
+    job_run.checkpoint = {"name": name, **data}
+    job_run.updated_at = timezone.now()
+    _progress_writer.add(job_run)
+
+
+def enqueue_jobs(jobs, session_id="", priority=PRIORITY_BULK, user=None):
+    """Lưu các job vào hàng đợi DB (ghi nhận người upload để chia lượt), trả về danh sách job_id."""
+    created_by = user if user is not None and user.is_authenticated else None
+    job_runs = [
+        JobRun(
+            job_id=str(uuid.uuid4()),
+            session_id=session_id,
+            profile_id=job["profile_id"],
+            keyword=job["keyword"],
+            name=job.get("name"),
+            payload=job,
+            priority=priority,
+            created_by=created_by,
+        )
+        for job in jobs
+    ]
+    JobRun.objects.bulk_create(job_runs)
+    JOBS_QUEUED.inc(len(job_runs))
+    return [job_run.job_id for job_run in job_runs]
+
+
+def read_jobs_status(session_id=None, job_ids=None):
+    """
+    Đọc status từ bảng JobRun, nguồn dữ liệu duy nhất nên mọi process web/worker thấy như nhau:
+    1 query theo session_id (có index) hoặc theo job_ids. Trả về (jobs_status, stats).
+    """
+    if session_id:
+        job_runs = JobRun.objects.filter(session_id=session_id)
+    else:
+        job_runs = JobRun.objects.filter(job_id__in=job_ids or [])
+    rows = {
+        row["job_id"]: row
+        for row in job_runs.order_by("id").values("job_id", *JOB_STATE_FIELDS)
+    }
+    job_ids = list(rows) if session_id else list(job_ids or [])
+
+    jobs_status = []
+    status_counts = Counter()
+    for job_id in job_ids:
+        job_data = rows.get(job_id) or {
+            "job_id": job_id,
+            "status": "unknown",
+            "profile_id": None,
+            "keyword": None,
+            "name": None,
+            "error": "Job không tồn tại",
+            "step": "",
+        }
+        jobs_status.append(job_data)
+        status_counts[job_data["status"]] += 1
+
+    stats = {
+        "total": len(jobs_status),
+        "pending": status_counts[JobRun.Status.PENDING],
+        "running": status_counts[JobRun.Status.RUNNING],
+        "success": status_counts[JobRun.Status.SUCCESS],
+        "failed": status_counts[JobRun.Status.FAILED],
+        "unknown": status_counts["unknown"],
+    }
+    return jobs_status, stats
+
+
+def read_jobs_changes(session_id=None, job_ids=None, since=None):
+    """
+    Các job thay đổi từ thời điểm since (None = tất cả) kèm thống kê session, dùng cho stream SSE.
+    Đọc từ DB để thấy được thay đổi của worker ở process khác. Trả về (jobs, stats, latest_updated_at).
+    """
+    if session_id:
+        job_runs = JobRun.objects.filter(session_id=session_id)
+    else:
+        job_runs = JobRun.objects.filter(job_id__in=job_ids or [])
+
+    changed = job_runs.order_by("id")
+    if since is not None:
+        changed = changed.filter(updated_at__gte=since)
+    jobs = []
+    latest = since
+    for job_run in changed:
+        jobs.append({"job_id": job_run.job_id, **_job_state(job_run)})
+        if latest is None or job_run.updated_at > latest:
+            latest = job_run.updated_at
+
+    if since is not None and not jobs:
+        return [], None, latest
+
+    status_counts = Counter(dict(job_runs.values_list("status").annotate(count=Count("id")).order_by()))
+    stats = {
+        "total": sum(status_counts.values()),
+        "pending": status_counts[JobRun.Status.PENDING],
+        "running": status_counts[JobRun.Status.RUNNING],
+        "success": status_counts[JobRun.Status.SUCCESS],
+        "failed": status_counts[JobRun.Status.FAILED],
+        "unknown": 0,
+    }
+    return jobs, stats, latest
+
+
+def _max_running_per_uploader() -> int:
+    return getattr(settings, "YOUTUBE_MAX_RUNNING_PER_UPLOADER", 0)
+
+
+def _session_order(claimable, now):
+    """
+    Thứ tự session được xét khi nhận job (fair share):
+    priority cao nhất của session trước, rồi session có người upload chưa chạm giới hạn job đang chạy,
+    rồi session đang có ít job chạy hơn, cuối cùng session có job chờ lâu nhất.
+    Giới hạn theo người upload là giới hạn mềm, chỉ dùng để xếp thứ tự: session của người đã chạm giới hạn
+    xếp sau mọi session khác nhưng không bị loại, nên khi chỉ còn họ có job chờ thì worker vẫn nhận
+    (không để trình duyệt trống).
+    """
+    running = JobRun.objects.filter(status=JobRun.Status.RUNNING, locked_until__gte=now)
+    session_running = dict(running.values_list("session_id").annotate(count=Count("id")).order_by())
+    cap = _max_running_per_uploader()
+    capped = set()
+    if cap > 0:
+        capped = {
+            user_id
+            for user_id, count in running.values_list("created_by").annotate(count=Count("id")).order_by()
+            if user_id is not None and count >= cap
+        }
+
+    heads = (
+        claimable.values("session_id", "created_by")
+        .annotate(top_priority=Max("priority"), first_id=Min("id"))
+        .order_by()
+    )
+    heads = sorted(
+        heads,
+        key=lambda head: (
+            -head["top_priority"],
+            head["created_by"] in capped,
+            session_running.get(head["session_id"], 0),
+            head["first_id"],
+        ),
+    )
+    order = []
+    for head in heads:
+        if head["session_id"] not in order:
+            order.append(head["session_id"])
+    return order[:CLAIM_SESSION_LIMIT]
+
+
+def _try_claim(candidates, worker_name, now):
+    """Đánh dấu running job đầu tiên trong candidates mà chưa worker nào nhận (UPDATE có điều kiện)."""
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    for job_run in candidates[:CLAIM_BATCH_SIZE]:
+        claimed = JobRun.objects.filter(
+            pk=job_run.pk,
+            status=job_run.status,
+            locked_until=job_run.locked_until,
+        ).update(
+            status=JobRun.Status.RUNNING,
+            worker=worker_name,
+            locked_until=now + JOB_LEASE,
+            started_at=now,
+            error=None,
+            step="",
+            attempts=F("attempts") + 1,
+            next_run_at=None,
+            updated_at=now,
+        )
+        if claimed:
+            job_run.status = JobRun.Status.RUNNING
+            job_run.worker = worker_name
+            job_run.locked_until = now + JOB_LEASE
+            job_run.started_at = now
+            job_run.error = None
+            job_run.step = ""
+            job_run.attempts += 1
+            job_run.next_run_at = None
+            job_run.updated_at = now
+            _job_leases.add(job_run)
+            return job_run
+    return None
+
+
+def claim_job(worker_name, profile_id=None):
+    """
+    Nhận 1 job đang chờ (hoặc job running đã hết lease do worker chết).
+    Postgres dùng SELECT ... FOR UPDATE SKIP LOCKED; SQLite dựa vào UPDATE có điều kiện,
+    nên 2 worker không bao giờ nhận trùng 1 job.
+    Truyền profile_id để chỉ nhận job của profile đó (dùng lại phiên trình duyệt đang mở);
+    ngược lại bỏ qua các profile đang bận để worker không phải đứng chờ lock, và chọn session
+    theo priority/fair share (xem _session_order) để sheet lớn không chặn các yêu cầu nhỏ.
+    """
+    now = timezone.now()
+    claimable = JobRun.objects.filter(
+        (Q(status=JobRun.Status.PENDING) & (Q(next_run_at__isnull=True) | Q(next_run_at__lte=now)))
+        | Q(status=JobRun.Status.RUNNING, locked_until__lt=now)
+    )
+
+    with transaction.atomic():
+        claimed_job = None
+        if profile_id is not None:
+            candidates = claimable.filter(profile_id=profile_id).order_by("-priority", "id")
+            claimed_job = _try_claim(candidates, worker_name, now)
+        else:
+            with _ACTIVE_PROFILES_LOCK:
+                active_profiles = list(_ACTIVE_PROFILES)
+            busy_profiles = JobRun.objects.filter(
+                status=JobRun.Status.RUNNING, locked_until__gte=now
+            ).values("profile_id")
+            claimable = claimable.exclude(profile_id__in=busy_profiles).exclude(profile_id__in=active_profiles)
+            for session_id in _session_order(claimable, now):
+                candidates = claimable.filter(session_id=session_id).order_by("-priority", "id")
+                claimed_job = _try_claim(candidates, worker_name, now)
+                if claimed_job is not None:
+                    break
+
+    if claimed_job is not None:
+        JOBS_STARTED.inc()
+        QUEUE_WAIT.observe((now - claimed_job.created_at).total_seconds())
+    return claimed_job
+
+
+def _finish_job(job_run, status, error=None, timings=None, logs="", error_cls=""):
+    _progress_writer.discard(job_run)
+    _job_leases.discard(job_run)
+    job_run.status = status
+    job_run.error = error
+    job_run.error_class = error_cls
+    job_run.timings = timings or []
+    job_run.logs = logs
+    job_run.locked_until = None
+    job_run.finished_at = timezone.now()
+    job_run.updated_at = job_run.finished_at
+    job_run.save(update_fields=[
+        "status", "error", "error_class", "step", "checkpoint", "timings", "logs", "locked_until",
+        "finished_at", "updated_at",
+    ])
+
+
+def _session_retry_budget_left(session_id):
+    """
+    Số lần thử lại còn được dùng của session (1 query aggregate trên DB, đúng cho mọi worker).
+    Đã dùng = các lần chạy lại đã diễn ra + các job đang pending chờ tới lượt thử lại.
+    """
+    stats = JobRun.objects.filter(session_id=session_id).aggregate(
+        total=Count("id"),
+        retry_attempts=Sum("attempts", filter=Q(attempts__gt=1)),
+        retried_jobs=Count("id", filter=Q(attempts__gt=1)),
+        scheduled=Count("id", filter=Q(status=JobRun.Status.PENDING, attempts__gte=1)),
+    )
+    used = (stats["retry_attempts"] or 0) - stats["retried_jobs"] + stats["scheduled"]
+    budget = max(SESSION_RETRY_MIN, int(stats["total"] * SESSION_RETRY_RATIO))
+    return budget - used
+
+
+def _playlist_created(job_run):
+    return (job_run.checkpoint or {}).get("name") == PLAYLIST_CREATED_CHECKPOINT
+
+
+def _should_retry(job_run, exc):
+    if not is_transient(exc) or job_run.attempts >= MAX_ATTEMPTS or _playlist_created(job_run):
+        return False
+    if not job_run.session_id:
+        return True
+    return _session_retry_budget_left(job_run.session_id) > 0
+
+
+def _schedule_retry(job_run, error, error_cls, timings, logs):
+    """Đưa job lỗi tạm thời về pending, hẹn chạy lại sau backoff lũy thừa (có jitter)."""
+    delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (job_run.attempts - 1))
+    _progress_writer.discard(job_run)
+    _job_leases.discard(job_run)
+    now = timezone.now()
+    job_run.status = JobRun.Status.PENDING
+    job_run.error = error
+    job_run.error_class = error_cls
+    job_run.timings = timings or []
+    job_run.logs = logs
+    job_run.step = f"Chờ thử lại ({job_run.attempts + 1}/{MAX_ATTEMPTS})"
+    job_run.worker = ""
+    job_run.locked_until = None
+    job_run.next_run_at = now + timedelta(seconds=random.uniform(delay / 2, delay))
+    job_run.updated_at = now
+    job_run.save(update_fields=[
+        "status", "error", "error_class", "timings", "logs", "step", "checkpoint", "worker", "locked_until",
+        "next_run_at", "updated_at",
+    ])
+    logger.warning(
+        "🔁 Job %s lỗi tạm thời (%s), chạy lại lúc %s",
+        job_run.job_id, error_cls, job_run.next_run_at.isoformat(), extra={"error_class": error_cls},
+    )
+
+
+def _run_single_job(job_run, session=None):
+    """Chạy một job, cập nhật status, lưu thời gian từng bước và log của job."""
+    if _playlist_created(job_run):
+        # Worker trước chết sau khi đã bấm tạo playlist: không chạy lại để tránh tạo playlist trùng
+        error = "Playlist đã được tạo ở lần chạy trước nhưng chưa lấy được link, không chạy lại"
+        _finish_job(job_run, JobRun.Status.FAILED, error, job_run.timings, job_run.logs, "PlaylistUrlError")
+        JOBS_FINISHED.inc(status=JobRun.Status.FAILED, error_class="PlaylistUrlError")
+        return
+    timer = StepTimer()
+    JOBS_RUNNING.inc()
+    with job_logging(job_run.job_id, job_run.profile_id) as log_lines:
+        try:
+            run_for_profile(
+                job_run.payload,
+                session,
+                on_step=lambda step, label: _report_step(job_run, step, label),
+                timer=timer,
+                on_checkpoint=lambda name, data: _save_checkpoint(job_run, name, data),
+            )
+        except Exception as e:
+            # Chỉ lấy message ngắn gọn, không lấy stacktrace
+            error = str(e).split("\n")[0]
+            error_cls = error_class(e)
+            if _should_retry(job_run, e):
+                _schedule_retry(job_run, error, error_cls, timer.spans, "\n".join(log_lines))
+                JOBS_RETRIED.inc(error_class=error_cls)
+            else:
+                _finish_job(job_run, JobRun.Status.FAILED, error, timer.spans, "\n".join(log_lines), error_cls)
+                JOBS_FINISHED.inc(status=JobRun.Status.FAILED, error_class=error_cls)
+        else:
+            _finish_job(job_run, JobRun.Status.SUCCESS, timings=timer.spans, logs="\n".join(log_lines))
+            JOBS_FINISHED.inc(status=JobRun.Status.SUCCESS)
+        finally:
+            JOBS_RUNNING.dec()
+
+
+def _claim_next_for_profile(worker_name, profile_id, stop_event, poll_interval):
+    """Chờ tối đa SESSION_IDLE_TIMEOUT để nhận job tiếp theo của cùng profile."""
+    deadline = time.monotonic() + SESSION_IDLE_TIMEOUT
+    while not stop_event.is_set():
+        close_old_connections()
+        job_run = claim_job(worker_name, profile_id=profile_id)
+        remaining = deadline - time.monotonic()
+        if job_run is not None or remaining <= 0:
+            return job_run
+        stop_event.wait(min(poll_interval, remaining))
+    return None
+
+
+def _run_profile_jobs(job_run, worker_name, stop_event, poll_interval):
+    """Chạy job_run rồi tiếp tục các job cùng profile trong 1 phiên trình duyệt."""
+    profile_id = job_run.profile_id
+    with _ACTIVE_PROFILES_LOCK:
+        _ACTIVE_PROFILES.add(profile_id)
+    try:
+        with BrowserSession(profile_id) as session:
+            while job_run is not None:
+                _run_single_job(job_run, session)
+                job_run = _claim_next_for_profile(worker_name, profile_id, stop_event, poll_interval)
+    finally:
+        # Job đã nhận nhưng chưa kết thúc (vd. lỗi mở trình duyệt): ngừng gia hạn để lease hết hạn
+        # và worker khác nhận lại
+        if job_run is not None:
+            _job_leases.discard(job_run)
+        with _ACTIVE_PROFILES_LOCK:
+            _ACTIVE_PROFILES.discard(profile_id)
+
+
+def _worker_loop(worker_name, stop_event, poll_interval, burst):
+    db_errors = 0
+    while not stop_event.is_set():
+        # Chỉ nhận job khi máy còn chỗ mở trình duyệt, tránh job "running" nhưng đứng chờ tài nguyên
+        if not admission.wait_for_capacity(stop_event):
+            break
+        close_old_connections()
+        try:
+            job_run = claim_job(worker_name)
+        except DatabaseError as e:
+            # Lỗi DB tạm thời (vd. SQLite "database is locked") không được làm chết thread worker
+            db_errors += 1
+            backoff = min(CLAIM_ERROR_BACKOFF_MAX, poll_interval * 2 ** db_errors)
+            logger.warning(
+                "⚠️ Worker %s lỗi DB khi nhận job (%s), thử lại sau %.1fs",
+                worker_name, str(e).split("\n")[0], backoff,
+            )
+            close_old_connections()
+            stop_event.wait(backoff)
+            continue
+        db_errors = 0
+        if job_run is None:
+            # --burst: chỉ thoát khi không còn job chờ, kể cả job đang chờ tới lượt thử lại
+            if burst and not JobRun.objects.filter(status=JobRun.Status.PENDING).exists():
+                break
+            stop_event.wait(poll_interval)
+            continue
+        try:
+            _run_profile_jobs(job_run, worker_name, stop_event, poll_interval)
+        except Exception as e:  # pragma: no cover - log runtime issue
+            logger.exception("❌ Worker %s lỗi khi xử lý job %s: %s", worker_name, job_run.job_id, e)
+    close_old_connections()
+
+
+def run_workers(worker_count, stop_event, poll_interval=2.0, burst=False):
+    """Chạy worker_count thread nhận job từ DB cho tới khi stop_event được set."""
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(
+            target=_worker_loop,
+            args=(f"{prefix}:{idx}", stop_event, poll_interval, burst),
+            name=f"youtube-worker-{idx}",
+        )
+        for idx in range(worker_count)
+    ]
+    for t in threads:
+        t.start()
+    return threads
@@ -0,0 +1,103 @@
+"""
+Kết quả tìm kiếm theo keyword, gom từ các job đã chạy thành công.
+Dùng để báo trước các job trùng keyword khi import sheet và (tuỳ chọn) chạy sau hoặc bỏ qua chúng.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# run: chạy tất cả theo thứ tự sheet; defer: job trùng keyword chạy sau cùng;
+# skip: bỏ job có keyword đã có kết quả còn mới (job lặp lại trong sheet vẫn chạy sau cùng)
+DUPLICATE_MODES = ("run", "defer", "skip")
+# Số keyword trùng tối đa liệt kê trong báo cáo
+OVERLAP_REPORT_LIMIT = 50
+
+
+def normalize_keyword(keyword) -> str:
+    return " ".join(str(keyword or "").split()).lower()
+
+
+def job_locale(job: dict) -> str:
+    return str(job.get("locale") or "").strip().lower()
+
+
+def _max_age() -> timedelta:
+    return timedelta(seconds=getattr(settings, "KEYWORD_RESULT_MAX_AGE", 24 * 3600))
+
+
+def record_keyword_result(keyword: str, locale: str, video_ids):
+    """Lưu danh sách video mới nhất của keyword (gọi khi job chạy thành công)."""
+    from .models import KeywordResult
+
+    now = timezone.now()
+    key = {"keyword": normalize_keyword(keyword), "locale": locale}
+    changes = {"video_ids": list(video_ids), "refreshed_at": now, "updated_at": now}
+    if KeywordResult.objects.filter(**key).update(runs=F("runs") + 1, **changes):
+        return
+    try:
+        with transaction.atomic():
+            KeywordResult.objects.create(runs=1, **key, **changes)
+    except IntegrityError:  # job khác vừa tạo cùng keyword
+        KeywordResult.objects.filter(**key).update(runs=F("runs") + 1, **changes)
+
+
+def fresh_keyword_results(keys) -> dict:
+    """{(keyword, locale): KeywordResult} của các key đã chuẩn hoá còn kết quả mới."""
+    from .models import KeywordResult
+
+    keys = set(keys)
+    if not keys:
+        return {}
+    results = KeywordResult.objects.filter(
+        keyword__in={keyword for keyword, _ in keys},
+        refreshed_at__gte=timezone.now() - _max_age(),
+    ).only("keyword", "locale", "video_ids", "refreshed_at")
+    return {(r.keyword, r.locale): r for r in results if (r.keyword, r.locale) in keys}
+
+
+def plan_jobs(jobs: list, mode: str = "run") -> tuple:
+    """
+    Tìm job trùng keyword (đã có kết quả còn mới hoặc lặp lại trong cùng sheet),
+    sắp xếp/bỏ bớt theo mode. Trả về (jobs cần queue, báo cáo overlap).
+    """
+    keys = [(normalize_keyword(job["keyword"]), job_locale(job)) for job in jobs]
+    fresh = fresh_keyword_results(keys)
+
+    first, later, skipped = [], [], []
+    fresh_jobs = repeated_jobs = 0
+    seen = set()
+    for job, key in zip(jobs, keys):
+        if key in fresh:
+            fresh_jobs += 1
+            (skipped if mode == "skip" else later).append(job)
+        elif key in seen:
+            repeated_jobs += 1
+            later.append(job)
+        else:
+            first.append(job)
+        seen.add(key)
+
+    planned = jobs if mode == "run" else first + later
+    known_videos = set()
+    for result in fresh.values():
+        known_videos.update(result.video_ids)
+    overlap = {
+        "fresh_keywords": len(fresh),
+        "fresh_jobs": fresh_jobs,
+        "repeated_jobs": repeated_jobs,
+        "skipped_jobs": len(skipped),
+        "known_videos": len(known_videos),
+        "keywords": [
+            {
+                "keyword": keyword,
+                "locale": locale,
+                "videos": len(result.video_ids),
+                "refreshed_at": result.refreshed_at.isoformat(),
+            }
+            for (keyword, locale), result in list(fresh.items())[:OVERLAP_REPORT_LIMIT]
+        ],
+    }
+    return planned, overlap
@@ -0,0 +1,65 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from apps.youtube.jobs import run_workers
+from tools.metrics import start_metrics_server
+
+
+class Command(BaseCommand):
+    help = "Chạy worker nhận và xử lý các job tool YouTube từ hàng đợi trong DB."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Số thread worker (mặc định 4). Số Chrome mở thực tế còn bị giới hạn bởi "
+                 "YOUTUBE_MAX_BROWSERS, RAM trống và tải CPU.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Số giây chờ giữa các lần kiểm tra hàng đợi khi không có job",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Thoát khi hàng đợi trống thay vì chờ job mới",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Mở endpoint /metrics (Prometheus) của process worker trên 127.0.0.1:<port>",
+        )
+
+    def handle(self, *args, **options):
+        worker_count = max(1, options["workers"])
+        stop_event = threading.Event()
+        # SIGTERM (systemd/supervisor) dừng nhận job mới, job đang chạy vẫn được hoàn tất
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        if options["metrics_port"]:
+            start_metrics_server(options["metrics_port"])
+            self.stdout.write(f"📈 Metrics tại http://127.0.0.1:{options['metrics_port']}/metrics")
+        threads = run_workers(
+            worker_count,
+            stop_event,
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+        )
+        self.stdout.write(f"🚀 Đã khởi động {worker_count} worker, nhấn Ctrl+C để dừng.")
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("⏳ Đang dừng worker, chờ các job đang chạy hoàn tất...")
+            stop_event.set()
+            for t in threads:
+                t.join()
+
+        self.stdout.write(self.style.SUCCESS("✅ Worker đã dừng."))
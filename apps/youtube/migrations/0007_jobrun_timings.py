@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0006_tablecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='timings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
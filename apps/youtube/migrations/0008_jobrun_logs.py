@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0007_jobrun_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='logs',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
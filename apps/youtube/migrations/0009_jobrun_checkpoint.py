@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0008_jobrun_logs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0010_jobrun_retry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jobrun',
+            index=models.Index(fields=['session_id', 'status'], name='youtube_job_session_b441bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobrun',
+            index=models.Index(fields=['status', 'finished_at'], name='youtube_job_status_5b3538_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0011_jobrun_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoyoutube',
+            name='video_id',
+            field=models.CharField(blank=True, max_length=11, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='videoyoutube',
+            constraint=models.UniqueConstraint(fields=('playlist', 'video_id'), name='unique_playlist_video_id'),
+        ),
+    ]
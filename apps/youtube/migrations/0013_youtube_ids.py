@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0012_videoyoutube_video_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlistyoutube',
+            name='playlist_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='videoyoutube',
+            name='video_id',
+            field=models.CharField(blank=True, db_index=True, max_length=11, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='playlistyoutube',
+            index=models.Index(fields=['profile', 'name'], name='youtube_pla_profile_b9f873_idx'),
+        ),
+    ]
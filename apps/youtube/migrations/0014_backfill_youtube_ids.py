@@ -0,0 +1,62 @@
+from django.db import migrations
+
+from apps.youtube.youtube_ids import extract_playlist_id, extract_video_id
+
+BATCH_SIZE = 2000
+
+
+def backfill_playlist_ids(apps, schema_editor):
+    PlaylistYoutube = apps.get_model("youtube", "PlaylistYoutube")
+    batch = []
+    for playlist in PlaylistYoutube.objects.filter(playlist_id__isnull=True).only("id", "youtube_link").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        playlist.playlist_id = extract_playlist_id(playlist.youtube_link)
+        if playlist.playlist_id:
+            batch.append(playlist)
+        if len(batch) >= BATCH_SIZE:
+            PlaylistYoutube.objects.bulk_update(batch, ["playlist_id"])
+            batch = []
+    if batch:
+        PlaylistYoutube.objects.bulk_update(batch, ["playlist_id"])
+
+
+def backfill_video_ids(apps, schema_editor):
+    """Video trùng (cùng playlist, cùng ID) giữ video_id NULL để không vi phạm unique (playlist, video_id)."""
+    VideoYoutube = apps.get_model("youtube", "VideoYoutube")
+    batch = []
+    current_playlist = None
+    seen = set()
+    videos = VideoYoutube.objects.only("id", "playlist_id", "youtube_link", "video_id").order_by("playlist_id", "id")
+    for video in videos.iterator(chunk_size=BATCH_SIZE):
+        if video.playlist_id != current_playlist:
+            current_playlist = video.playlist_id
+            seen = set(
+                VideoYoutube.objects.filter(playlist_id=current_playlist, video_id__isnull=False)
+                .values_list("video_id", flat=True)
+            )
+        if video.video_id:
+            continue
+        video_id = extract_video_id(video.youtube_link)
+        if not video_id or video_id in seen:
+            continue
+        seen.add(video_id)
+        video.video_id = video_id
+        batch.append(video)
+        if len(batch) >= BATCH_SIZE:
+            VideoYoutube.objects.bulk_update(batch, ["video_id"])
+            batch = []
+    if batch:
+        VideoYoutube.objects.bulk_update(batch, ["video_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0013_youtube_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_playlist_ids, migrations.RunPython.noop),
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0014_backfill_youtube_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordResult',
+            fields=[
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Deleted')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Deleted at')),
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date created')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date updated')),
+                ('is_hidden', models.BooleanField(default=False, verbose_name='Hidden')),
+                ('keyword', models.CharField(max_length=255)),
+                ('locale', models.CharField(blank=True, default='', max_length=35)),
+                ('video_ids', models.JSONField(blank=True, default=list)),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+                ('created_by', models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(app_label)s_%(class)s_created', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('updated_by', models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(app_label)s_%(class)s_updated', to=settings.AUTH_USER_MODEL, verbose_name='Updated by')),
+            ],
+            options={
+                'verbose_name': 'Keyword Result',
+                'verbose_name_plural': 'Keyword Results',
+                'constraints': [models.UniqueConstraint(fields=('keyword', 'locale'), name='unique_keyword_locale')],
+            },
+        ),
+    ]
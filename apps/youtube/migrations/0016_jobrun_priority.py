@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0015_keywordresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='priority',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
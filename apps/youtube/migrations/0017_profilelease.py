@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube', '0016_jobrun_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gpm_id', models.CharField(db_index=True, max_length=255)),
+                ('holder', models.CharField(max_length=255)),
+                ('heartbeat_at', models.DateTimeField()),
+                ('acquired_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Profile Lease',
+                'verbose_name_plural': 'Profile Leases',
+            },
+        ),
+    ]
@@ -1,6 +1,16 @@
 from django.db import models
 from whiteneuron.base.models import BaseModel
 
+from .youtube_ids import PLAYLIST_ID_MAX_LENGTH, extract_playlist_id, extract_video_id
+
+
+def _fill_id_from_link(instance, field: str, extract, kwargs):
+    """Tách ID từ youtube_link (link không có ID thì giữ ID cũ); update_fields có youtube_link thì ghi cả ID."""
+    setattr(instance, field, extract(instance.youtube_link) or getattr(instance, field))
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "youtube_link" in update_fields:
+        kwargs["update_fields"] = {*update_fields, field}
+
 # Create your models here.
 class ProfileYoutube(BaseModel):
     gpm_id = models.CharField(max_length=255, unique=True)
@@ -24,26 +34,130 @@ class PlaylistYoutube(BaseModel):
     profile = models.ForeignKey(ProfileYoutube, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     youtube_link = models.CharField(max_length=10000)
+    # ID tách từ youtube_link, dùng để tìm/so khớp thay cho link
+    playlist_id = models.CharField(max_length=PLAYLIST_ID_MAX_LENGTH, blank=True, null=True, db_index=True)
     number_of_videos = models.IntegerField(default=0)
 
     class Meta:
         verbose_name = "Playlist Youtube"
         verbose_name_plural = "Playlists Youtube"
+        indexes = [
+            models.Index(fields=["profile", "name"]),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.profile.name}"
 
+    def save(self, *args, **kwargs):
+        _fill_id_from_link(self, "playlist_id", extract_playlist_id, kwargs)
+        super().save(*args, **kwargs)
+
 class VideoYoutube(BaseModel):
     playlist = models.ForeignKey(PlaylistYoutube, on_delete=models.CASCADE)
     youtube_link = models.CharField(max_length=10000)
+    # ID 11 ký tự tách từ youtube_link, dùng để tìm/so khớp thay cho link
+    video_id = models.CharField(max_length=11, blank=True, null=True, db_index=True)
 
     class Meta:
         verbose_name = "Video Youtube"
         verbose_name_plural = "Videos Youtube"
+        constraints = [
+            models.UniqueConstraint(fields=["playlist", "video_id"], name="unique_playlist_video_id"),
+        ]
 
     def __str__(self):
         return f"{self.youtube_link[:50]}..." if len(self.youtube_link) > 50 else self.youtube_link
 
+    def save(self, *args, **kwargs):
+        _fill_id_from_link(self, "video_id", extract_video_id, kwargs)
+        super().save(*args, **kwargs)
+
+
+
+class JobRun(BaseModel):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        SUCCESS = "success", "Success"
+        FAILED = "failed", "Failed"
+
+    job_id = models.CharField(max_length=36, unique=True)
+    session_id = models.CharField(max_length=36, blank=True, default="", db_index=True)
+    profile_id = models.CharField(max_length=255)
+    keyword = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, blank=True, null=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    # Job có priority cao hơn được nhận trước (chạy tay 1 profile > import sheet)
+    priority = models.SmallIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    error_class = models.CharField(max_length=100, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    # Job lỗi tạm thời được chạy lại sau thời điểm này (backoff)
+    next_run_at = models.DateTimeField(blank=True, null=True)
+    step = models.CharField(max_length=255, blank=True, default="")
+    # Thời gian từng bước: [{"step", "label", "duration", "outcome", "retries"}]
+    timings = models.JSONField(default=list, blank=True)
+    # Checkpoint gần nhất của job: {"name": "searched"|"loaded"|"playlist_created", ...}
+    checkpoint = models.JSONField(default=dict, blank=True)
+    # Log của job (JSON lines), gom trong lúc chạy và lưu khi job kết thúc
+    logs = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=255, blank=True, default="")
+    locked_until = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Job Run"
+        verbose_name_plural = "Job Runs"
+        indexes = [
+            models.Index(fields=["session_id", "updated_at"]),
+            models.Index(fields=["session_id", "status"]),
+            models.Index(fields=["status", "next_run_at"]),
+            models.Index(fields=["status", "finished_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.keyword} - {self.profile_id} ({self.status})"
+
+
+class KeywordResult(BaseModel):
+    # Keyword đã chuẩn hoá (chữ thường, gộp khoảng trắng)
+    keyword = models.CharField(max_length=255)
+    locale = models.CharField(max_length=35, blank=True, default="")
+    # ID các video của lần chạy thành công gần nhất
+    video_ids = models.JSONField(default=list, blank=True)
+    runs = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Keyword Result"
+        verbose_name_plural = "Keyword Results"
+        constraints = [
+            models.UniqueConstraint(fields=["keyword", "locale"], name="unique_keyword_locale"),
+        ]
+
+    def __str__(self):
+        return f"{self.keyword} ({self.locale})" if self.locale else self.keyword
+
+
+class ProfileLease(models.Model):
+    """
+    Hàng đợi giữ GPM profile giữa các process (xem tools/profile_lease.py).
+    Dòng được xoá thật khi trả lease nên không dùng BaseModel.
+    """
+    gpm_id = models.CharField(max_length=255, db_index=True)
+    holder = models.CharField(max_length=255)
+    heartbeat_at = models.DateTimeField()
+    # Thời điểm tới lượt giữ profile; null là đang chờ
+    acquired_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Profile Lease"
+        verbose_name_plural = "Profile Leases"
+
+    def __str__(self):
+        return f"{self.gpm_id} - {self.holder}"
 
 
 class ImportToolProxy(ProfileYoutube):
@@ -57,3 +171,20 @@ class DashboardProxy(ProfileYoutube):
         verbose_name = "ToolsDashboard"
         verbose_name_plural = "Tools Dashboards"
         proxy = True
+
+
+class TableCounter(models.Model):
+    """
+    Tổng số dòng của các bảng lớn (playlist/video) cho dashboard, cập nhật bằng UPDATE cộng dồn
+    nên mọi process (web, worker) dùng chung 1 giá trị. Xem apps/youtube/stats.py.
+    """
+    # model._meta.label_lower, vd. "youtube.videoyoutube"
+    name = models.CharField(max_length=100, unique=True)
+    total = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Table Counter"
+        verbose_name_plural = "Table Counters"
+
+    def __str__(self):
+        return f"{self.name}: {self.total}"
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import PlaylistYoutube, VideoYoutube
+from .stats import adjust_total
+
+
+@receiver(post_save, sender=PlaylistYoutube)
+@receiver(post_save, sender=VideoYoutube)
+def increase_total(sender, instance, created, **kwargs):
+    if created:
+        adjust_total(sender, 1)
+
+
+# Không gắn receiver xoá cho VideoYoutube: có receiver thì cascade phải load và phát signal cho từng video
+@receiver(pre_delete, sender=PlaylistYoutube)
+def decrease_totals_on_playlist_delete(sender, instance, **kwargs):
+    adjust_total(PlaylistYoutube, -1)
+    adjust_total(VideoYoutube, -instance.videoyoutube_set.count())
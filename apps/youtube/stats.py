@@ -0,0 +1,122 @@
+import math
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Payload dashboard được cache ngắn hạn, tổng playlist/video được duy trì trong bảng TableCounter
+DASHBOARD_CACHE_KEY = "dashboard_stats"
+DASHBOARD_CACHE_TIMEOUT = 30
+# Số job kết thúc gần nhất dùng để tính p50/p95 thời gian từng bước
+STEP_TIMING_SAMPLE = 500
+# Số ngày gần nhất hiển thị throughput job
+THROUGHPUT_DAYS = 14
+
+
+def cached_total(model):
+    """Tổng số dòng của model đọc từ TableCounter, chỉ COUNT(*) khi counter chưa có."""
+    from .models import TableCounter
+
+    name = model._meta.label_lower
+    total = TableCounter.objects.filter(name=name).values_list("total", flat=True).first()
+    if total is None:
+        counter, _ = TableCounter.objects.get_or_create(name=name, defaults={"total": model.objects.count()})
+        total = counter.total
+    return total
+
+
+def adjust_total(model, delta):
+    """Cộng/trừ counter trên DB (process nào ghi cũng thấy); counter chưa có thì để lần đọc sau tự đếm."""
+    from .models import TableCounter
+
+    if delta:
+        TableCounter.objects.filter(name=model._meta.label_lower).update(total=F("total") + delta)
+
+
+def invalidate_totals(*models):
+    """Xoá counter để lần đọc sau đếm lại (dùng sau bulk delete vì thao tác này không phát signal)."""
+    from .models import TableCounter
+
+    TableCounter.objects.filter(name__in=[model._meta.label_lower for model in models]).delete()
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+
+def _percentile(sorted_values, percent):
+    """Percentile kiểu nearest-rank trên list đã sắp xếp."""
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _step_sort_key(step):
+    """Bước chạy lẻ là số, script gộp nhiều bước có key dạng "7-13": xếp theo bước đầu tiên."""
+    first = str(step).split("-")[0]
+    return int(first) if first.isdigit() else 0, str(step)
+
+
+def step_timing_stats(sample=STEP_TIMING_SAMPLE):
+    """
+    Tổng hợp thời gian từng bước của các job kết thúc gần nhất:
+    [{"step", "label", "count", "p50", "p95", "errors", "retries"}] theo thứ tự bước.
+    """
+    from .models import JobRun
+
+    timings = (
+        JobRun.objects.filter(finished_at__isnull=False)
+        .order_by("-finished_at")
+        .values_list("timings", flat=True)[:sample]
+    )
+    grouped = {}
+    for spans in timings:
+        for span in spans or []:
+            if span.get("duration") is None:
+                continue
+            item = grouped.setdefault(span["step"], {"label": span.get("label", ""), "durations": [], "errors": 0, "retries": 0})
+            item["durations"].append(span["duration"])
+            item["errors"] += span.get("outcome") == "error"
+            item["retries"] += span.get("retries", 0)
+
+    result = []
+    for step in sorted(grouped, key=_step_sort_key):
+        item = grouped[step]
+        durations = sorted(item["durations"])
+        result.append({
+            "step": step,
+            "label": item["label"],
+            "count": len(durations),
+            "p50": _percentile(durations, 50),
+            "p95": _percentile(durations, 95),
+            "errors": item["errors"],
+            "retries": item["retries"],
+        })
+    return result
+
+
+def job_throughput(days=THROUGHPUT_DAYS):
+    """
+    Số job kết thúc mỗi ngày (theo giờ địa phương) trong `days` ngày gần nhất:
+    [{"day", "success", "failed", "avg_duration"}], ngày cũ trước.
+    """
+    from .models import JobRun
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = (
+        JobRun.objects.filter(
+            finished_at__date__gte=since,
+            status__in=[JobRun.Status.SUCCESS, JobRun.Status.FAILED],
+        )
+        .annotate(day=TruncDate("finished_at"))
+        .values("day", "status")
+        .annotate(count=Count("id"), avg_duration=Avg(F("finished_at") - F("started_at")))
+        .order_by("day")
+    )
+    result = {}
+    for row in rows:
+        item = result.setdefault(row["day"], {
+            "day": row["day"].isoformat(), "success": 0, "failed": 0, "avg_duration": None,
+        })
+        item[row["status"]] = row["count"]
+        if row["status"] == JobRun.Status.SUCCESS and row["avg_duration"] is not None:
+            item["avg_duration"] = round(row["avg_duration"].total_seconds(), 1)
+    return list(result.values())
@@ -1,3 +1,592 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from tools.admission import AdmissionController
+from tools.errors import PageLoadError
+from tools.gpm_client import MAX_RETRIES, CircuitBreaker, GPMClient, GPMError, GPMUnavailable
+from tools.metrics import Counter, Histogram, Registry
+from tools.profile_lease import LEASE_TIMEOUT, ProfileLeaseManager
+
+from . import jobs, views
+from .keyword_results import plan_jobs, record_keyword_result
+from .models import JobRun, PlaylistYoutube, ProfileLease, ProfileYoutube, VideoYoutube
+from .stats import cached_total, invalidate_totals
+from .youtube_ids import extract_playlist_id, extract_video_id
+
+
+def create_profile(gpm_id, **fields):
+    fields = {"name": gpm_id, "raw_proxy": "", "profile_path": f"/profiles/{gpm_id}", "browser_type": "chrome",
+              "browser_version": "120", "note": "", **fields}
+    return ProfileYoutube.objects.create(gpm_id=gpm_id, **fields)
+
+
+class ClaimJobTests(TestCase):
+    def setUp(self):
+        # Không chạy thread gia hạn lease job trong test
+        patcher = mock.patch.object(jobs._JobLeaseKeeper, "add")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def enqueue(self, profile_ids, session_id="", user=None, priority=jobs.PRIORITY_BULK):
+        return jobs.enqueue_jobs(
+            [{"profile_id": profile_id, "keyword": "k"} for profile_id in profile_ids],
+            session_id=session_id, priority=priority, user=user,
+        )
+
+    def claim_all(self):
+        claimed = []
+        while (job_run := jobs.claim_job("worker")) is not None:
+            claimed.append(job_run.profile_id)
+        return claimed
+
+    def test_job_is_claimed_only_once(self):
+        self.enqueue(["p1"])
+        job_run = jobs.claim_job("worker-1")
+        self.assertIsNotNone(job_run)
+        self.assertIsNone(jobs.claim_job("worker-2"))
+
+        job_run.refresh_from_db()
+        self.assertEqual(job_run.status, JobRun.Status.RUNNING)
+        self.assertEqual(job_run.worker, "worker-1")
+        self.assertEqual(job_run.attempts, 1)
+
+    def test_expired_lease_is_reclaimed(self):
+        self.enqueue(["p1"])
+        job_run = jobs.claim_job("worker-1")
+        JobRun.objects.filter(pk=job_run.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        reclaimed = jobs.claim_job("worker-2")
+        self.assertEqual(reclaimed.pk, job_run.pk)
+        self.assertEqual(reclaimed.worker, "worker-2")
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_busy_profile_is_skipped(self):
+        self.enqueue(["p1", "p1"])
+        jobs.claim_job("worker-1")
+        self.assertIsNone(jobs.claim_job("worker-2"))
+        # Worker đang giữ phiên trình duyệt của profile vẫn nhận được job tiếp theo của profile đó
+        self.assertIsNotNone(jobs.claim_job("worker-1", profile_id="p1"))
+
+    def test_retry_waits_for_next_run_at(self):
+        self.enqueue(["p1"])
+        JobRun.objects.update(next_run_at=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(jobs.claim_job("worker"))
+
+    @override_settings(YOUTUBE_MAX_RUNNING_PER_UPLOADER=0)
+    def test_sessions_take_turns(self):
+        self.enqueue(["A0", "A1"], session_id="sheet-a", user=self.alice)
+        self.enqueue(["B0", "B1"], session_id="sheet-b", user=self.bob)
+
+        # Sheet nhập sau không phải chờ sheet trước chạy hết
+        self.assertEqual(self.claim_all(), ["A0", "B0", "A1", "B1"])
+
+    @override_settings(YOUTUBE_MAX_RUNNING_PER_UPLOADER=2)
+    def test_priority_then_fair_share_between_sessions(self):
+        self.enqueue([f"A{i}" for i in range(4)], session_id="sheet-a", user=self.alice)
+        self.enqueue(["B0", "B1"], session_id="sheet-b", user=self.bob)
+        self.enqueue(["I"], user=self.alice, priority=jobs.PRIORITY_INTERACTIVE)
+
+        self.assertEqual(self.claim_all(), ["I", "A0", "B0", "B1", "A1", "A2", "A3"])
+
+    @override_settings(YOUTUBE_MAX_RUNNING_PER_UPLOADER=1)
+    def test_uploader_at_cap_yields_to_other_uploaders(self):
+        self.enqueue(["A0"], session_id="sheet-a1", user=self.alice)
+        self.enqueue(["A1"], session_id="sheet-a2", user=self.alice)
+        self.enqueue(["B0"], session_id="sheet-b", user=self.bob)
+
+        # Hết session khác thì alice vẫn được nhận tiếp (không để worker rảnh)
+        self.assertEqual(self.claim_all(), ["A0", "B0", "A1"])
+
+    @override_settings(YOUTUBE_MAX_RUNNING_PER_UPLOADER=0)
+    def test_no_uploader_cap(self):
+        self.enqueue(["A0"], session_id="sheet-a1", user=self.alice)
+        self.enqueue(["A1"], session_id="sheet-a2", user=self.alice)
+        self.enqueue(["B0"], session_id="sheet-b", user=self.bob)
+
+        self.assertEqual(self.claim_all(), ["A0", "A1", "B0"])
+
+
+@mock.patch.object(jobs._JobLeaseKeeper, "_run", lambda self: None)
+class JobLeaseKeeperTests(TestCase):
+    def test_renew_extends_only_held_jobs(self):
+        jobs.enqueue_jobs([{"profile_id": "p1", "keyword": "k"}, {"profile_id": "p2", "keyword": "k"}])
+        soon = timezone.now()
+        JobRun.objects.update(status=JobRun.Status.RUNNING, locked_until=soon)
+        held, released = JobRun.objects.order_by("id")
+
+        keeper = jobs._JobLeaseKeeper()
+        keeper.add(held)
+        keeper.add(released)
+        keeper.discard(released)
+        keeper.renew()
+
+        held.refresh_from_db()
+        released.refresh_from_db()
+        self.assertGreater(held.locked_until, soon + jobs.JOB_LEASE / 2)
+        self.assertEqual(released.locked_until, soon)
+
+
+# close_old_connections trong TestCase sẽ đóng kết nối đang giữ transaction của test
+@mock.patch.object(jobs, "close_old_connections")
+class WorkerLoopTests(TestCase):
+    @mock.patch.object(jobs.admission, "wait_for_capacity", return_value=True)
+    def test_database_error_does_not_kill_worker(self, *mocks):
+        error = DatabaseError("database is locked")
+        with mock.patch.object(jobs, "claim_job", side_effect=[error, None]) as claim_job:
+            jobs._worker_loop("worker", threading.Event(), poll_interval=0, burst=True)
+
+        # Lỗi DB lần đầu chỉ làm worker chờ rồi nhận lại, burst thoát khi hết job
+        self.assertEqual(claim_job.call_count, 2)
+
+
+@mock.patch("tools.admission.cpu_load", return_value=None)
+@mock.patch("tools.admission.free_memory_mb", return_value=None)
+class AdmissionControllerTests(SimpleTestCase):
+    def setUp(self):
+        slot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(slot_dir.cleanup)
+        self.slot_dir = slot_dir.name
+
+    def controller(self, **kwargs):
+        return AdmissionController(slot_dir=self.slot_dir, **{"max_browsers": 2, **kwargs})
+
+    def test_browser_limit_is_shared_between_processes(self, free_memory_mb, cpu_load):
+        # Mỗi controller đóng vai 1 process, dùng chung thư mục slot
+        first, second = self.controller(), self.controller()
+        first.acquire()
+        second.acquire()
+        self.assertFalse(first.has_capacity())
+        self.assertFalse(self.controller().has_capacity())
+
+        second.release()
+        self.assertTrue(self.controller().has_capacity())
+        first.release()
+
+    def test_limit_backs_off_on_latency_and_recovers(self, free_memory_mb, cpu_load):
+        controller = self.controller(max_browsers=10, latency_target=5.0)
+        controller.record_latency(20)
+        self.assertEqual(int(controller.limit), 7)
+        # Chưa hết cooldown thì không giảm tiếp
+        controller.record_latency(20)
+        self.assertEqual(int(controller.limit), 7)
+
+        for _ in range(50):
+            controller.record_latency(0)
+        self.assertEqual(controller.limit, 10)
+
+    def test_waits_for_free_memory(self, free_memory_mb, cpu_load):
+        controller = self.controller(min_free_memory_mb=1000)
+        free_memory_mb.return_value = 1500
+        self.assertTrue(controller.has_capacity())
+
+        controller.acquire()
+        # Trình duyệt vừa mở chưa chiếm hết RAM nên vẫn giữ phần RAM dự trữ cho nó
+        self.assertFalse(controller.has_capacity())
+        free_memory_mb.return_value = 2500
+        self.assertTrue(controller.has_capacity())
+        controller.release()
+
+    def test_waits_for_cpu(self, free_memory_mb, cpu_load):
+        controller = self.controller(max_cpu_load=0.8)
+        cpu_load.return_value = 0.95
+        self.assertFalse(controller.has_capacity())
+        cpu_load.return_value = 0.5
+        self.assertTrue(controller.has_capacity())
+
+
+class JobsStatusTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(jobs._JobLeaseKeeper, "add")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.job_ids = jobs.enqueue_jobs(
+            [{"profile_id": "p1", "keyword": "a"}, {"profile_id": "p2", "keyword": "b"}], session_id="sheet"
+        )
+
+    def test_session_status_and_stats(self):
+        jobs._finish_job(jobs.claim_job("worker"), JobRun.Status.FAILED, "boom")
+
+        jobs_status, stats = jobs.read_jobs_status(session_id="sheet")
+        self.assertEqual([job["job_id"] for job in jobs_status], self.job_ids)
+        self.assertEqual([job["status"] for job in jobs_status], [JobRun.Status.FAILED, JobRun.Status.PENDING])
+        self.assertEqual(jobs_status[0]["error"], "boom")
+        self.assertEqual(stats, {"total": 2, "pending": 1, "running": 0, "success": 0, "failed": 1, "unknown": 0})
+
+    def test_unknown_job_ids(self):
+        jobs_status, stats = jobs.read_jobs_status(job_ids=[self.job_ids[0], "missing"])
+        self.assertEqual([job["status"] for job in jobs_status], [JobRun.Status.PENDING, "unknown"])
+        self.assertEqual((stats["pending"], stats["unknown"]), (1, 1))
+
+    def test_changes_since(self):
+        changed, stats, latest = jobs.read_jobs_changes(session_id="sheet")
+        self.assertEqual([job["job_id"] for job in changed], self.job_ids)
+        self.assertEqual(stats["pending"], 2)
+
+        since = latest + timedelta(seconds=1)
+        self.assertEqual(jobs.read_jobs_changes(session_id="sheet", since=since), ([], None, since))
+
+        updated_at = latest + timedelta(seconds=5)
+        JobRun.objects.filter(job_id=self.job_ids[1]).update(updated_at=updated_at)
+        changed, stats, latest = jobs.read_jobs_changes(session_id="sheet", since=since)
+        self.assertEqual([job["job_id"] for job in changed], [self.job_ids[1]])
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(latest, updated_at)
+
+    def test_stream_falls_back_to_polling_without_asgi(self):
+        staff = User.objects.create(username="staff", is_staff=True)
+        request = RequestFactory().get("/youtube/jobs/stream/", {"session_id": "sheet"})
+        request.user = staff
+
+        async def auser():
+            return staff
+
+        request.auser = auser
+        response = async_to_sync(views.stream_jobs_status)(request)
+        # 204: trình duyệt chuyển sang gọi get_jobs_status định kỳ
+        self.assertEqual(response.status_code, 204)
+
+
+class ImportGpmProfilesTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        create_profile("g1", name="Tên cũ")
+        create_profile("g2")
+
+    def import_profiles(self, profiles):
+        request = RequestFactory().post("/youtube/import-gpm-profiles/")
+        request.user = self.staff
+        data = {"data": profiles}
+        with mock.patch.object(views, "get_gpm_profiles", return_value=data):
+            response = views.import_gpm_profiles(request)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_only_changed_profiles_are_written(self):
+        result = self.import_profiles([
+            {"id": "g1", "name": "Tên mới", "profile_path": "/profiles/g1", "browser_type": "chrome",
+             "browser_version": "120"},
+            {"id": "g2", "name": "g2", "profile_path": "/profiles/g2", "browser_type": "chrome",
+             "browser_version": "120"},
+            {"id": "g3", "name": "g3"},
+            {"id": ""},
+        ])
+
+        self.assertEqual((result["created"], result["updated"], result["unchanged"]), (1, 1, 1))
+        self.assertEqual(ProfileYoutube.objects.get(gpm_id="g1").name, "Tên mới")
+        self.assertEqual(ProfileYoutube.objects.count(), 3)
+
+
+class ExportRowsTests(TestCase):
+    def test_duplicate_playlists_are_grouped(self):
+        profile = create_profile("g1", name="A", is_done=True)
+        create_profile("g2", name="B", is_done=True)
+        create_profile("g3", name="C")
+        first = "https://www.youtube.com/playlist?list=PL1"
+        second = "https://www.youtube.com/playlist?list=PL2"
+        PlaylistYoutube.objects.create(profile=profile, name="L1", youtube_link=first)
+        PlaylistYoutube.objects.create(profile=profile, name="L2", youtube_link=second)
+        PlaylistYoutube.objects.create(profile=profile, name="L1", youtube_link=first)
+
+        self.assertEqual(list(views._export_rows()), [
+            [1, "g1", "A", "L1", first],
+            [2, "g1", "A", "L2", second],
+            # Profile chưa có playlist vẫn có 1 dòng
+            [3, "g2", "B", "", ""],
+        ])
+
+
+class TableCounterTests(TestCase):
+    def totals(self):
+        return cached_total(PlaylistYoutube), cached_total(VideoYoutube)
+
+    def test_totals_follow_saves_and_deletes(self):
+        self.assertEqual(self.totals(), (0, 0))
+        playlist = PlaylistYoutube.objects.create(profile=create_profile("g1"), name="L1", youtube_link="PL1")
+        VideoYoutube.objects.create(playlist=playlist, youtube_link="https://youtu.be/aaaaaaaaaaa")
+        VideoYoutube.objects.create(playlist=playlist, youtube_link="https://youtu.be/bbbbbbbbbbb")
+        self.assertEqual(self.totals(), (1, 2))
+
+        # Xoá playlist xoá luôn video của nó (cascade)
+        playlist.delete()
+        self.assertEqual(self.totals(), (0, 0))
+
+    def test_invalidate_recounts(self):
+        self.assertEqual(self.totals(), (0, 0))
+        PlaylistYoutube.objects.bulk_create([PlaylistYoutube(profile=create_profile("g1"), name="L1")])
+        # bulk_create không phát signal nên counter chỉ đúng lại sau khi invalidate
+        self.assertEqual(cached_total(PlaylistYoutube), 0)
+        invalidate_totals(PlaylistYoutube)
+        self.assertEqual(cached_total(PlaylistYoutube), 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(GPMUnavailable):
+            breaker.before_call()
+
+        # Hết thời gian chờ: chỉ cho 1 request thử (half-open)
+        breaker.opened_at -= 31
+        breaker.before_call()
+        with self.assertRaises(GPMUnavailable):
+            breaker.before_call()
+
+        breaker.record_success()
+        breaker.before_call()
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        breaker.opened_at -= 31
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(GPMUnavailable):
+            breaker.before_call()
+
+
+@mock.patch("tools.gpm_client.RETRY_BACKOFF", 0)
+class GPMClientTests(SimpleTestCase):
+    def setUp(self):
+        self.gpm = GPMClient(base_url="http://gpm.test/api/v3/profiles")
+
+    def response(self, status_code, data=None):
+        return mock.Mock(status_code=status_code, **{"json.return_value": data})
+
+    def session_get(self, side_effect):
+        return mock.patch.object(self.gpm.session, "get", side_effect=side_effect)
+
+    def test_server_error_is_retried(self):
+        with self.session_get([self.response(502), self.response(200, {"data": []})]) as get:
+            self.assertEqual(self.gpm.list_profiles(), {"data": []})
+        self.assertEqual(get.call_count, 2)
+
+    def test_gives_up_after_max_retries(self):
+        with self.session_get(requests.ConnectionError("refused")) as get:
+            with self.assertRaises(GPMError):
+                self.gpm.list_profiles()
+        self.assertEqual(get.call_count, MAX_RETRIES + 1)
+
+    def test_start_is_retried_only_before_reaching_gpm(self):
+        with self.session_get([requests.ConnectionError("refused"), self.response(200, {"success": True})]) as get:
+            self.assertEqual(self.gpm.start_profile("g1"), {"success": True})
+        self.assertEqual(get.call_count, 2)
+
+        # Timeout khi đọc: GPM có thể đã mở trình duyệt, không gọi start lần nữa
+        with self.session_get(requests.ReadTimeout("read timed out")) as get:
+            with self.assertRaises(GPMError):
+                self.gpm.start_profile("g1")
+        self.assertEqual(get.call_count, 1)
+
+    def test_client_error_is_not_retried(self):
+        with self.session_get([self.response(404)]) as get:
+            with self.assertRaises(GPMError):
+                self.gpm.close_profile("g1")
+        self.assertEqual(get.call_count, 1)
+
+
+class RegistryTests(SimpleTestCase):
+    def test_render_text_format(self):
+        registry = Registry()
+        finished = registry.register(Counter("jobs_finished_total", "Số job đã kết thúc", ["status"]))
+        latency = registry.register(Histogram("latency_seconds", "Độ trễ", buckets=(1, 5)))
+        finished.inc(status="success")
+        finished.inc(2, status='fail"ed')
+        latency.observe(0.5)
+        latency.observe(3)
+
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP jobs_finished_total Số job đã kết thúc",
+            "# TYPE jobs_finished_total counter",
+            'jobs_finished_total{status="success"} 1',
+            'jobs_finished_total{status="fail\\"ed"} 2',
+            "# HELP latency_seconds Độ trễ",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{le="1"} 1',
+            'latency_seconds_bucket{le="5"} 2',
+            'latency_seconds_bucket{le="+Inf"} 2',
+            "latency_seconds_sum 3.5",
+            "latency_seconds_count 2",
+        ]) + "\n")
+
+
+class MetricsViewTests(TestCase):
+    def get(self, user):
+        request = RequestFactory().get("/youtube/metrics/", REMOTE_ADDR="10.0.0.5")
+        request.user = user
+        return views.metrics(request)
+
+    def test_requires_staff_or_allowed_addr(self):
+        self.assertEqual(self.get(AnonymousUser()).status_code, 403)
+        self.assertEqual(self.get(User(username="staff", is_staff=True)).status_code, 200)
+        with override_settings(METRICS_ALLOWED_ADDRS=["10.0.0.5"]):
+            response = self.get(AnonymousUser())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'youtube_jobs{status="pending"} 0', response.content)
+
+
+class JobRetryTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(jobs._JobLeaseKeeper, "add")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        jobs.enqueue_jobs([{"profile_id": "p1", "keyword": "k"}])
+        self.job_run = jobs.claim_job("worker")
+
+    def run_job(self):
+        with mock.patch.object(jobs, "run_for_profile", side_effect=PageLoadError("Trang tải quá chậm")):
+            jobs._run_single_job(self.job_run)
+        self.job_run.refresh_from_db()
+
+    def test_transient_error_is_retried_later(self):
+        self.run_job()
+        self.assertEqual(self.job_run.status, JobRun.Status.PENDING)
+        self.assertGreater(self.job_run.next_run_at, timezone.now())
+        self.assertEqual(self.job_run.error_class, "PageLoadError")
+
+    def test_gives_up_after_max_attempts(self):
+        JobRun.objects.filter(pk=self.job_run.pk).update(attempts=jobs.MAX_ATTEMPTS)
+        self.job_run.attempts = jobs.MAX_ATTEMPTS
+        self.run_job()
+        self.assertEqual(self.job_run.status, JobRun.Status.FAILED)
+
+    def test_no_retry_after_playlist_created(self):
+        self.job_run.checkpoint = {"name": jobs.PLAYLIST_CREATED_CHECKPOINT}
+        self.run_job()
+        self.assertEqual(self.job_run.status, JobRun.Status.FAILED)
+        self.assertEqual(self.job_run.error_class, "PlaylistUrlError")
+
+
+class SessionRetryBudgetTests(TestCase):
+    def setUp(self):
+        jobs.enqueue_jobs([{"profile_id": f"p{i}", "keyword": "k"} for i in range(20)], session_id="sheet")
+
+    def test_budget_is_ratio_of_session_size(self):
+        self.assertEqual(jobs._session_retry_budget_left("sheet"), 4)
+
+    def test_small_session_gets_minimum_budget(self):
+        jobs.enqueue_jobs([{"profile_id": "p", "keyword": "k"}], session_id="small")
+        self.assertEqual(jobs._session_retry_budget_left("small"), jobs.SESSION_RETRY_MIN)
+
+    def test_past_and_scheduled_retries_are_counted(self):
+        job_pks = list(JobRun.objects.order_by("id").values_list("pk", flat=True))
+        # 1 job đã chạy 3 lần (2 lần thử lại), 1 job đang chờ tới lượt thử lại
+        JobRun.objects.filter(pk=job_pks[0]).update(status=JobRun.Status.SUCCESS, attempts=3)
+        JobRun.objects.filter(pk=job_pks[1]).update(
+            attempts=1, next_run_at=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertEqual(jobs._session_retry_budget_left("sheet"), 1)
+
+
+class YoutubeIdTests(SimpleTestCase):
+    def test_extract_video_id(self):
+        for link in [
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLx",
+            "https://youtu.be/dQw4w9WgXcQ?t=10",
+            "youtube.com/shorts/dQw4w9WgXcQ",
+            "https://www.youtube.com/embed/dQw4w9WgXcQ",
+            " dQw4w9WgXcQ ",
+        ]:
+            with self.subTest(link=link):
+                self.assertEqual(extract_video_id(link), "dQw4w9WgXcQ")
+
+        for link in [None, "", "https://www.youtube.com/playlist?list=PL1", "https://youtu.be/short"]:
+            with self.subTest(link=link):
+                self.assertIsNone(extract_video_id(link))
+
+    def test_extract_playlist_id(self):
+        playlist_id = "PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf"
+        self.assertEqual(extract_playlist_id(f"https://www.youtube.com/playlist?list={playlist_id}"), playlist_id)
+        self.assertEqual(extract_playlist_id(f"https://youtube.com/watch?v=dQw4w9WgXcQ&list={playlist_id}"), playlist_id)
+        self.assertEqual(extract_playlist_id(playlist_id), playlist_id)
+        self.assertIsNone(extract_playlist_id("https://www.youtube.com/watch?v=dQw4w9WgXcQ"))
+        self.assertIsNone(extract_playlist_id("https://www.youtube.com/playlist?list=bad"))
+
+
+class PlanJobsTests(TestCase):
+    def setUp(self):
+        record_keyword_result("lofi music", "", ["v1", "v2"])
+        self.jobs = [
+            {"profile_id": "p1", "keyword": "Lofi  Music"},
+            {"profile_id": "p2", "keyword": "rain"},
+            {"profile_id": "p3", "keyword": "Rain"},
+            {"profile_id": "p4", "keyword": "jazz"},
+        ]
+
+    def planned_profiles(self, mode):
+        planned, overlap = plan_jobs(self.jobs, mode)
+        return [job["profile_id"] for job in planned], overlap
+
+    def test_run_keeps_sheet_order(self):
+        planned, overlap = self.planned_profiles("run")
+        self.assertEqual(planned, ["p1", "p2", "p3", "p4"])
+        self.assertEqual(
+            (overlap["fresh_keywords"], overlap["fresh_jobs"], overlap["repeated_jobs"], overlap["known_videos"]),
+            (1, 1, 1, 2),
+        )
+
+    def test_defer_runs_duplicates_last(self):
+        planned, overlap = self.planned_profiles("defer")
+        self.assertEqual(planned, ["p2", "p4", "p1", "p3"])
+        self.assertEqual(overlap["skipped_jobs"], 0)
+
+    def test_skip_drops_fresh_keywords(self):
+        planned, overlap = self.planned_profiles("skip")
+        # Keyword lặp lại trong sheet vẫn chạy (sau cùng), chỉ bỏ keyword đã có kết quả còn mới
+        self.assertEqual(planned, ["p2", "p4", "p3"])
+        self.assertEqual(overlap["skipped_jobs"], 1)
+
+
+@mock.patch.object(ProfileLeaseManager, "_heartbeat_loop", lambda self: None)
+class ProfileLeaseManagerTests(TestCase):
+    def setUp(self):
+        self.manager = ProfileLeaseManager()
+
+    def test_tickets_are_served_in_fifo_order(self):
+        first = self.manager._enqueue(ProfileLease, "g1")
+        second = self.manager._enqueue(ProfileLease, "g1")
+        third = self.manager._enqueue(ProfileLease, "g1")
+
+        self.assertEqual(self.manager._head(ProfileLease, "g1").pk, first)
+        self.manager._release_ticket(ProfileLease, first)
+        self.assertEqual(self.manager._head(ProfileLease, "g1").pk, second)
+        self.manager._release_ticket(ProfileLease, second)
+        self.assertEqual(self.manager._head(ProfileLease, "g1").pk, third)
+
+    def test_profiles_are_queued_separately(self):
+        self.manager._enqueue(ProfileLease, "g1")
+        handle = self.manager.acquire("g2")
+        self.assertEqual(handle.gpm_id, "g2")
+        self.manager.release(handle)
+        self.assertFalse(ProfileLease.objects.filter(gpm_id="g2").exists())
+
+    def test_stale_lease_is_reclaimed(self):
+        ProfileLease.objects.create(
+            gpm_id="g1", holder="dead-host:1:worker",
+            heartbeat_at=timezone.now() - timedelta(seconds=LEASE_TIMEOUT + 1),
+        )
+        handle = self.manager.acquire("g1")
+
+        self.assertEqual(list(ProfileLease.objects.values_list("pk", flat=True)), [handle.ticket])
+        self.assertIsNotNone(ProfileLease.objects.get(pk=handle.ticket).acquired_at)
+
+    def test_live_lease_is_kept(self):
+        live = ProfileLease.objects.create(gpm_id="g1", holder="other-host:1:worker", heartbeat_at=timezone.now())
+        ticket = self.manager._enqueue(ProfileLease, "g1")
+
+        self.assertEqual(self.manager._head(ProfileLease, "g1").pk, live.pk)
+        self.assertTrue(ProfileLease.objects.filter(pk=ticket).exists())
@@ -1,75 +1,44 @@
+import asyncio
+import csv
+import hashlib
 import json
-import threading
+import tempfile
+import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
-import requests
-from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment
 
-from django.http import JsonResponse, HttpResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
 from django.core.cache import cache
-
-from tools.auto_add_playlists import run_for_profile, DEFAULT_TARGET_TOTAL
-
-
-def _run_jobs_in_background(jobs, job_ids, max_workers=4):
-    """Chạy ThreadPoolExecutor trong thread nền để tránh block request."""
-    def runner():
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for idx, job in enumerate(jobs):
-                job_id = job_ids[idx]
-                future = executor.submit(_run_single_job, job, job_id)
-                futures.append(future)
-            
-            # best-effort wait để log lỗi nếu có
-            for f in futures:
-                try:
-                    f.result()
-                except Exception as e:  # pragma: no cover - log runtime issue
-                    print("❌ Worker error:", e)
-
-    t = threading.Thread(target=runner, daemon=True)
-    t.start()
-
-
-def _run_single_job(job, job_id):
-    """Chạy một job và cập nhật status."""
-    try:
-        # Cập nhật status: running
-        cache.set(f"job_{job_id}", {
-            "status": "running",
-            "profile_id": job.get("profile_id"),
-            "keyword": job.get("keyword"),
-            "name": job.get("name"),
-            "error": None,
-        }, timeout=3600)  # 1 giờ
-        
-        # Chạy job
-        run_for_profile(job)
-        
-        # Cập nhật status: success
-        cache.set(f"job_{job_id}", {
-            "status": "success",
-            "profile_id": job.get("profile_id"),
-            "keyword": job.get("keyword"),
-            "name": job.get("name"),
-            "error": None,
-        }, timeout=3600)
-    except Exception as e:
-        # Cập nhật status: failed
-        error_msg = str(e)
-        cache.set(f"job_{job_id}", {
-            "status": "failed",
-            "profile_id": job.get("profile_id"),
-            "keyword": job.get("keyword"),
-            "name": job.get("name"),
-            "error": error_msg,
-        }, timeout=3600)
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+
+from tools.auto_add_playlists import DEFAULT_TARGET_TOTAL
+from tools.gpm_client import GPMError, GPMUnavailable
+from tools.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, Gauge
+from .gpm_profiles import filter_profiles, get_gpm_profiles
+from .jobs import PRIORITY_INTERACTIVE, enqueue_jobs, read_jobs_changes, read_jobs_status
+from .keyword_results import DUPLICATE_MODES, plan_jobs
+from .stats import DASHBOARD_CACHE_KEY, DASHBOARD_CACHE_TIMEOUT, cached_total, job_throughput, step_timing_stats
+
+STREAM_INTERVAL = 1  # giây giữa các lần kiểm tra thay đổi
+STREAM_KEEPALIVE = 15
+# Đóng stream sau khoảng này, EventSource tự kết nối lại (tránh giữ connection mãi)
+STREAM_MAX_DURATION = 300
+# Đọc lùi một khoảng để không sót thay đổi của worker có đồng hồ lệch
+STREAM_CLOCK_SKEW = timedelta(seconds=5)
+# Số profile GPM mỗi trang trả về cho trang import
+GPM_PAGE_SIZE = 200
+GPM_PAGE_SIZE_MAX = 1000
 
 
 @csrf_exempt
@@ -80,8 +49,11 @@ def import_tool_run(request):
     Payload mẫu:
     {
         "filename": "file.xlsx",
-        "rows": [ { "profile_id": "...", "keyword": "...", "playlist_title": "..." }, ... ]
+        "rows": [ { "profile_id": "...", "keyword": "...", "playlist_title": "..." }, ... ],
+        "duplicate_mode": "run" | "defer" | "skip"
     }
+    Job có keyword đã có kết quả còn mới (hoặc lặp lại trong sheet) được báo trong "overlap";
+    duplicate_mode quyết định chạy bình thường, chạy sau cùng hay bỏ qua chúng.
     """
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Method not allowed"}, status=405)
@@ -93,8 +65,10 @@ def import_tool_run(request):
 
     rows = data.get("rows") or []
     filename = data.get("filename") or ""
-    max_workers = data.get("max_workers", 30)  # Mặc định 30
     target_total = data.get("target_total", DEFAULT_TARGET_TOTAL)
+    duplicate_mode = data.get("duplicate_mode") or "run"
+    if duplicate_mode not in DUPLICATE_MODES:
+        return JsonResponse({"success": False, "error": "duplicate_mode không hợp lệ"}, status=400)
 
     # Validate target_total (số video tối thiểu cần load)
     try:
@@ -104,16 +78,6 @@ def import_tool_run(request):
     except (ValueError, TypeError):
         target_total = DEFAULT_TARGET_TOTAL
 
-    # Validate max_workers
-    try:
-        max_workers = int(max_workers)
-        if max_workers < 1:
-            max_workers = 1
-        if max_workers > 100:
-            max_workers = 100
-    except (ValueError, TypeError):
-        max_workers = 30
-
     if not isinstance(rows, list) or len(rows) == 0:
         return JsonResponse({"success": False, "error": "Không có dữ liệu để xử lý"}, status=400)
 
@@ -150,39 +114,34 @@ def import_tool_run(request):
                     "browser_version": str(browser_version).strip() if browser_version else None,
                     "note": str(note).strip() if note else None,
                     "target_total": row_target_total,
+                    "locale": str(row["locale"]).strip() if row.get("locale") else None,
                 }
             )
 
     if not jobs:
         return JsonResponse({"success": False, "error": "Không tìm thấy profile_id/keyword hợp lệ"}, status=400)
 
-    # Tạo job IDs cho mỗi job
-    job_ids = [str(uuid.uuid4()) for _ in jobs]
+    jobs, overlap = plan_jobs(jobs, duplicate_mode)
+    if not jobs:
+        return JsonResponse(
+            {"success": False, "error": "Mọi keyword đều đã có kết quả còn mới, không có job nào cần chạy",
+             "overlap": overlap},
+            status=400,
+        )
+
+    # Đưa jobs vào hàng đợi DB, worker (manage.py run_youtube_workers) sẽ nhận và chạy
     session_id = str(uuid.uuid4())
-    
-    # Lưu danh sách job IDs vào cache với session_id
-    cache.set(f"session_{session_id}", job_ids, timeout=3600)
-    
-    # Khởi tạo status cho tất cả jobs là "pending"
-    for idx, job in enumerate(jobs):
-        cache.set(f"job_{job_ids[idx]}", {
-            "status": "pending",
-            "profile_id": job.get("profile_id"),
-            "keyword": job.get("keyword"),
-            "name": job.get("name"),
-            "error": None,
-        }, timeout=3600)
-
-    _run_jobs_in_background(jobs, job_ids, max_workers=min(max_workers, len(jobs)))
+    job_ids = enqueue_jobs(jobs, session_id=session_id, user=request.user)
 
     return JsonResponse(
         {
             "success": True,
-            "message": f"Đã queue {len(jobs)} job, đang chạy nền.",
+            "message": f"Đã queue {len(jobs)} job, đang chờ worker xử lý.",
             "filename": filename,
             "session_id": session_id,
             "job_ids": job_ids,
             "total_jobs": len(jobs),
+            "overlap": overlap,
         }
     )
 
@@ -191,14 +150,43 @@ def import_tool_run(request):
 def get_data_gpm(request):
     """
     Proxy lấy danh sách profiles từ GPM để tránh CORS trên frontend.
+    Danh sách được cache phía server; hỗ trợ lọc (?q=), phân trang (?page=, ?page_size=),
+    làm mới (?refresh=1) và ETag để trình duyệt nhận 304 khi dữ liệu không đổi.
     """
     try:
-        resp = requests.get("http://127.0.0.1:19995/api/v3/profiles", timeout=10)
-        data = resp.json()
-        return JsonResponse(data, status=resp.status_code, safe=False)
-    except Exception as e:
+        entry = get_gpm_profiles(force_refresh=request.GET.get("refresh") == "1")
+    except GPMUnavailable as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=503)
+    except GPMError as e:
         return JsonResponse({"success": False, "error": f"GPM request failed: {e}"}, status=500)
 
+    query = request.GET.get("q", "")
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+        page_size = min(GPM_PAGE_SIZE_MAX, max(1, int(request.GET.get("page_size", GPM_PAGE_SIZE))))
+    except ValueError:
+        return JsonResponse({"success": False, "error": "page/page_size không hợp lệ"}, status=400)
+
+    # ETag phụ thuộc cả nội dung GPM lẫn tham số lọc/phân trang
+    etag = quote_etag(hashlib.sha1(f"{entry['etag']}|{query}|{page}|{page_size}".encode("utf-8")).hexdigest())
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        profiles = filter_profiles(entry["data"], query)
+        start = (page - 1) * page_size
+        response = JsonResponse({
+            "success": True,
+            "data": profiles[start:start + page_size],
+            "total": len(profiles),
+            "page": page,
+            "page_size": page_size,
+            "has_next": start + page_size < len(profiles),
+            "fetched_at": entry["fetched_at"],
+        })
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
 
 @csrf_exempt
 @staff_member_required
@@ -210,75 +198,69 @@ def import_gpm_profiles(request):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Method not allowed"}, status=405)
 
+    # Import luôn lấy bản mới nhất từ GPM (đồng thời làm mới cache danh sách)
     try:
-        resp = requests.get("http://127.0.0.1:19995/api/v3/profiles", timeout=10)
-        resp.raise_for_status()
-        gpm_profiles = resp.json()
-    except requests.RequestException as e:
+        gpm_profiles = get_gpm_profiles(force_refresh=True)
+    except GPMUnavailable as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=503)
+    except GPMError as e:
         return JsonResponse({"success": False, "error": f"Không thể kết nối GPM: {e}"}, status=500)
-    except Exception as e:
-        return JsonResponse({"success": False, "error": f"Lỗi khi lấy dữ liệu GPM: {e}"}, status=500)
-
-    if not isinstance(gpm_profiles, dict) or not isinstance(gpm_profiles.get("data"), list):
-        return JsonResponse({"success": False, "error": "Dữ liệu GPM không hợp lệ"}, status=400)
 
     from .models import ProfileYoutube
 
-    created_count = 0
-    updated_count = 0
+    sync_fields = ["name", "raw_proxy", "profile_path", "browser_type", "browser_version", "note"]
 
+    # Gom dữ liệu GPM theo gpm_id (trùng id thì lấy bản cuối như khi ghi tuần tự)
+    incoming = {}
     for item in gpm_profiles.get("data", []):
         gpm_id = str(item.get("id", "")).strip()
-        name = str(item.get("name", "")).strip()
-        
         if not gpm_id:
             continue
+        incoming[gpm_id] = {
+            "name": str(item.get("name", "")).strip(),
+            "raw_proxy": item.get("raw_proxy", "") or "",
+            "profile_path": item.get("profile_path", "") or "",
+            "browser_type": item.get("browser_type", "") or "",
+            "browser_version": item.get("browser_version", "") or "",
+            "note": item.get("note", "") or "",
+        }
 
-        # Lấy các trường khác từ GPM response nếu có
-        raw_proxy = item.get("raw_proxy", "") or ""
-        profile_path = item.get("profile_path", "") or ""
-        browser_type = item.get("browser_type", "") or ""
-        browser_version = item.get("browser_version", "") or ""
-        note = item.get("note", "") or ""
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    unchanged_count = 0
 
-        # Kiểm tra profile đã tồn tại chưa
-        try:
-            profile = ProfileYoutube.objects.get(gpm_id=gpm_id)
-            profile.name = name
-            profile.raw_proxy = raw_proxy
-            profile.profile_path = profile_path
-            profile.browser_type = browser_type
-            profile.browser_version = browser_version
-            profile.note = note
-            profile.save(
-                update_fields=[
-                    "name",
-                    "raw_proxy",
-                    "profile_path",
-                    "browser_type",
-                    "browser_version",
-                    "note",
-                ]
-            )
-            updated_count += 1
-        except ProfileYoutube.DoesNotExist:
-            ProfileYoutube.objects.create(
-                gpm_id=gpm_id,
-                name=name,
-                raw_proxy=raw_proxy,
-                profile_path=profile_path,
-                browser_type=browser_type,
-                browser_version=browser_version,
-                note=note,
-                is_done=False,
-            )
-            created_count += 1
+    with transaction.atomic():
+        # 1 query lấy toàn bộ profile hiện có, so sánh để chỉ ghi các dòng thực sự thay đổi
+        existing = {
+            profile.gpm_id: profile
+            for profile in ProfileYoutube.objects.only("id", "gpm_id", *sync_fields)
+        }
+        for gpm_id, values in incoming.items():
+            profile = existing.get(gpm_id)
+            if profile is None:
+                to_create.append(ProfileYoutube(gpm_id=gpm_id, is_done=False, **values))
+                continue
+            if all(getattr(profile, field) == value for field, value in values.items()):
+                unchanged_count += 1
+                continue
+            for field, value in values.items():
+                setattr(profile, field, value)
+            profile.updated_at = now
+            to_update.append(profile)
+
+        ProfileYoutube.objects.bulk_create(to_create, batch_size=500)
+        ProfileYoutube.objects.bulk_update(to_update, sync_fields + ["updated_at"], batch_size=500)
+
+    created_count = len(to_create)
+    updated_count = len(to_update)
 
     return JsonResponse({
         "success": True,
         "message": f"Đã import {created_count + updated_count} profiles",
         "created": created_count,
         "updated": updated_count,
+        "unchanged": unchanged_count,
     })
 
 
@@ -293,39 +275,8 @@ def get_jobs_status(request):
     if not session_id and not job_ids_str:
         return JsonResponse({"success": False, "error": "Thiếu session_id hoặc job_ids"}, status=400)
     
-    # Lấy job_ids từ session_id nếu có
-    if session_id:
-        job_ids = cache.get(f"session_{session_id}", [])
-    else:
-        job_ids = [jid.strip() for jid in job_ids_str.split(",") if jid.strip()]
-    
-    jobs_status = []
-    for job_id in job_ids:
-        job_data = cache.get(f"job_{job_id}")
-        if job_data:
-            jobs_status.append({
-                "job_id": job_id,
-                **job_data
-            })
-        else:
-            jobs_status.append({
-                "job_id": job_id,
-                "status": "unknown",
-                "profile_id": None,
-                "keyword": None,
-                "name": None,
-                "error": "Job không tồn tại hoặc đã hết hạn",
-            })
-    
-    # Tính toán thống kê
-    stats = {
-        "total": len(jobs_status),
-        "pending": sum(1 for j in jobs_status if j["status"] == "pending"),
-        "running": sum(1 for j in jobs_status if j["status"] == "running"),
-        "success": sum(1 for j in jobs_status if j["status"] == "success"),
-        "failed": sum(1 for j in jobs_status if j["status"] == "failed"),
-        "unknown": sum(1 for j in jobs_status if j["status"] == "unknown"),
-    }
+    job_ids = [jid.strip() for jid in job_ids_str.split(",") if jid.strip()]
+    jobs_status, stats = read_jobs_status(session_id=session_id, job_ids=job_ids)
     
     return JsonResponse({
         "success": True,
@@ -334,6 +285,60 @@ def get_jobs_status(request):
     })
 
 
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@staff_member_required
+async def stream_jobs_status(request):
+    """
+    Server-Sent Events: đẩy thay đổi status/tiến độ của jobs theo session_id hoặc job_ids.
+    Event "jobs" chỉ chứa các job vừa thay đổi kèm stats; event "done" khi không còn job chờ/chạy.
+    Chỉ stream khi chạy qua ASGI (youtubetoolsmanager.asgi): dưới WSGI generator bị gom hết rồi mới gửi,
+    giữ 1 worker tới STREAM_MAX_DURATION, nên trả 204 ngay để client quay về polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    session_id = request.GET.get("session_id")
+    job_ids = [jid.strip() for jid in request.GET.get("job_ids", "").split(",") if jid.strip()]
+
+    if not session_id and not job_ids:
+        return JsonResponse({"success": False, "error": "Thiếu session_id hoặc job_ids"}, status=400)
+
+    async def event_stream():
+        sent = {}
+        since = None
+        snapshot_sent = False
+        started = last_event = time.monotonic()
+        while time.monotonic() - started < STREAM_MAX_DURATION:
+            query_since = since - STREAM_CLOCK_SKEW if since else None
+            jobs, stats, latest = await sync_to_async(read_jobs_changes)(session_id, job_ids, query_since)
+            changed = [job for job in jobs if sent.get(job["job_id"]) != job]
+            if latest and (since is None or latest > since):
+                since = latest
+
+            if changed or not snapshot_sent:
+                snapshot_sent = True
+                for job in changed:
+                    sent[job["job_id"]] = job
+                yield _sse_event("jobs", {"jobs": changed, "stats": stats})
+                last_event = time.monotonic()
+                if stats["total"] and stats["pending"] == 0 and stats["running"] == 0:
+                    yield _sse_event("done", {"stats": stats})
+                    return
+            elif time.monotonic() - last_event >= STREAM_KEEPALIVE:
+                yield ": keepalive\n\n"
+                last_event = time.monotonic()
+
+            await asyncio.sleep(STREAM_INTERVAL)
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @csrf_exempt
 @staff_member_required
 def run_tool_for_profile(request):
@@ -376,9 +381,6 @@ def run_tool_for_profile(request):
     except ProfileYoutube.DoesNotExist:
         return JsonResponse({"success": False, "error": "Profile không tồn tại"}, status=404)
 
-    # Tạo job ID để track
-    job_id = str(uuid.uuid4())
-    
     # Tạo job để chạy tool
     job = {
         "profile_id": str(profile.gpm_id),
@@ -393,53 +395,8 @@ def run_tool_for_profile(request):
         "target_total": target_total,
     }
 
-    # Khởi tạo status là pending
-    cache.set(f"job_{job_id}", {
-        "status": "pending",
-        "profile_id": str(profile.gpm_id),
-        "keyword": keyword,
-        "name": profile.name,
-        "error": None,
-    }, timeout=3600)
-
-    # Chạy tool trong background
-    def run_in_background():
-        try:
-            # Cập nhật status: running
-            cache.set(f"job_{job_id}", {
-                "status": "running",
-                "profile_id": str(profile.gpm_id),
-                "keyword": keyword,
-                "name": profile.name,
-                "error": None,
-            }, timeout=3600)
-            
-            run_for_profile(job)
-            
-            # Cập nhật status: success
-            cache.set(f"job_{job_id}", {
-                "status": "success",
-                "profile_id": str(profile.gpm_id),
-                "keyword": keyword,
-                "name": profile.name,
-                "error": None,
-            }, timeout=3600)
-        except Exception as e:
-            # Chỉ lấy message ngắn gọn, không lấy stacktrace
-            error_msg = str(e).split('\n')[0] if hasattr(e, '__str__') else str(e)
-            # Cập nhật status: failed
-            cache.set(f"job_{job_id}", {
-                "status": "failed",
-                "profile_id": str(profile.gpm_id),
-                "keyword": keyword,
-                "name": profile.name,
-                "error": error_msg,
-            }, timeout=3600)
-            print(f"❌ Error running tool for profile {profile.gpm_id}: {error_msg}")
-
-    import threading
-    thread = threading.Thread(target=run_in_background, daemon=True)
-    thread.start()
+    # Đưa vào hàng đợi, worker sẽ chạy nền
+    job_id = enqueue_jobs([job], priority=PRIORITY_INTERACTIVE, user=request.user)[0]
 
     return JsonResponse({
         "success": True,
@@ -455,15 +412,19 @@ def dashboard_stats(request):
     """
     from .models import ProfileYoutube, PlaylistYoutube, VideoYoutube
     from django.db.models import Count, Q
-    from django.utils import timezone
-    from datetime import timedelta
 
-    # Thống kê cơ bản
-    total_profiles = ProfileYoutube.objects.count()
-    done_profiles = ProfileYoutube.objects.filter(is_done=True).count()
-    pending_profiles = ProfileYoutube.objects.filter(is_done=False).count()
-    total_playlists = PlaylistYoutube.objects.count()
-    total_videos = VideoYoutube.objects.count()
+    payload = cache.get(DASHBOARD_CACHE_KEY)
+    if payload is not None:
+        return JsonResponse(payload)
+
+    # Thống kê cơ bản: 1 query aggregate cho profile, tổng playlist/video lấy từ counter
+    profile_counts = ProfileYoutube.objects.aggregate(
+        total=Count('id'),
+        done=Count('id', filter=Q(is_done=True)),
+        pending=Count('id', filter=Q(is_done=False)),
+    )
+    total_playlists = cached_total(PlaylistYoutube)
+    total_videos = cached_total(VideoYoutube)
 
     # Thống kê theo browser type
     browser_types = ProfileYoutube.objects.values('browser_type').annotate(
@@ -486,18 +447,98 @@ def dashboard_stats(request):
         for p in recent_profiles
     ]
 
-    return JsonResponse({
+    payload = {
         "success": True,
         "stats": {
-            "total_profiles": total_profiles,
-            "done_profiles": done_profiles,
-            "pending_profiles": pending_profiles,
+            "total_profiles": profile_counts["total"],
+            "done_profiles": profile_counts["done"],
+            "pending_profiles": profile_counts["pending"],
             "total_playlists": total_playlists,
             "total_videos": total_videos,
         },
         "browser_types": browser_types_dict,
         "recent_profiles": recent_profiles_data,
-    })
+        "step_timings": step_timing_stats(),
+        "throughput": job_throughput(),
+    }
+    cache.set(DASHBOARD_CACHE_KEY, payload, timeout=DASHBOARD_CACHE_TIMEOUT)
+    return JsonResponse(payload)
+
+
+def metrics(request):
+    """
+    Metrics dạng Prometheus của process web, kèm số job theo trạng thái đọc từ DB
+    (đúng cho mọi process worker). Chỉ cho phép staff đã đăng nhập hoặc IP trong settings.METRICS_ALLOWED_ADDRS.
+    Metrics riêng của worker xem qua `run_youtube_workers --metrics-port`.
+    """
+    allowed_addrs = getattr(settings, "METRICS_ALLOWED_ADDRS", ())
+    if request.META.get("REMOTE_ADDR") not in allowed_addrs and not request.user.is_staff:
+        return HttpResponse(status=403)
+
+    from .models import JobRun
+
+    jobs_by_status = Gauge("youtube_jobs", "Số job trong DB theo trạng thái", ["status"])
+    for status in JobRun.Status.values:
+        jobs_by_status.set(0, status=status)
+    for status, count in JobRun.objects.values_list("status").annotate(count=Count("id")).order_by():
+        jobs_by_status.set(count, status=status)
+    return HttpResponse(REGISTRY.render(extra=[jobs_by_status]), content_type=METRICS_CONTENT_TYPE)
+
+
+EXPORT_HEADERS = ['STT', 'Profile ID', 'Name', 'Tên Danh Sách Phát', 'Link Danh Sách Phát']
+
+
+def _export_rows():
+    """
+    Sinh từng dòng export (STT, profile_id, name, playlist name, playlist link) cho profiles is_done=True.
+    Playlist trùng lặp (cùng tên và cùng link) của 1 profile chỉ ra 1 dòng, profile chưa có playlist vẫn có 1 dòng.
+    Toàn bộ dữ liệu lấy bằng 1 query: LEFT JOIN playlist, GROUP BY (profile, tên, link) để DB loại trùng,
+    sắp xếp theo profile rồi theo playlist xuất hiện đầu tiên.
+    """
+    from .models import ProfileYoutube
+
+    rows = (
+        ProfileYoutube.objects.filter(is_done=True)
+        .values(
+            'id',
+            'gpm_id',
+            'name',
+            playlist_name=F('playlistyoutube__name'),
+            playlist_link=F('playlistyoutube__youtube_link'),
+        )
+        .annotate(first_playlist_id=Min('playlistyoutube__id'))
+        .order_by('id', 'first_playlist_id')
+    )
+
+    for stt, row in enumerate(rows.iterator(chunk_size=2000), start=1):
+        yield [
+            stt,
+            row['gpm_id'],
+            row['name'],
+            row['playlist_name'] or '',
+            row['playlist_link'] or '',
+        ]
+
+
+class _Echo:
+    """File-like tối giản cho csv.writer: trả lại dòng vừa ghi thay vì lưu lại."""
+
+    def write(self, value):
+        return value
+
+
+def _export_csv_response(filename):
+    writer = csv.writer(_Echo())
+
+    def stream():
+        yield '\ufeff'  # BOM để Excel đọc đúng UTF-8
+        yield writer.writerow(EXPORT_HEADERS)
+        for row in _export_rows():
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
 
 
 @staff_member_required
@@ -506,65 +547,16 @@ def export_excel(request):
     Xuất file Excel với format: STT, profile_id, name, playlist name, playlist link
     Gom nhóm các playlist của cùng profile vào 1 dòng
     Chỉ lấy profiles có is_done=True
+    Dùng workbook write-only (ghi dần ra file tạm) và trả file theo từng chunk nên bộ nhớ
+    không tăng theo số profile; ?format=csv để stream CSV trực tiếp.
     """
-    from .models import ProfileYoutube, PlaylistYoutube
-
-    # Chỉ lấy profiles có is_done=True
-    profiles = ProfileYoutube.objects.filter(is_done=True).prefetch_related('playlistyoutube_set').all().order_by('id')
+    filename = f"youtube_profiles_playlists_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if request.GET.get('format') == 'csv':
+        return _export_csv_response(filename)
 
     # Tạo workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Profiles & Playlists"
-
-    # Headers
-    headers = ['STT', 'Profile ID', 'Name', 'Tên Danh Sách Phát', 'Link Danh Sách Phát']
-    ws.append(headers)
-
-    # Style headers
-    header_font = Font(bold=True, size=12)
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = header_alignment
-
-    # Dữ liệu - gom nhóm các playlist trùng lặp vào 1 ô, các playlist khác nhau mỗi cái 1 dòng
-    stt = 1
-    for profile in profiles:
-        playlists = profile.playlistyoutube_set.all().order_by('id')
-        
-        # Loại bỏ các playlist trùng lặp (cùng tên và cùng link), chỉ giữ lại unique
-        seen_playlists = set()
-        unique_playlists = []
-        
-        for playlist in playlists:
-            # Tạo key từ tên và link để kiểm tra trùng lặp
-            playlist_key = (playlist.name or '', playlist.youtube_link or '')
-            if playlist_key not in seen_playlists:
-                seen_playlists.add(playlist_key)
-                unique_playlists.append(playlist)
-        
-        # Nếu có playlist, mỗi playlist unique 1 dòng
-        if unique_playlists:
-            for playlist in unique_playlists:
-                ws.append([
-                    stt,
-                    profile.gpm_id,
-                    profile.name,
-                    playlist.name or '',
-                    playlist.youtube_link or '',
-                ])
-                stt += 1
-        else:
-            # Nếu không có playlist, vẫn thêm dòng với profile info
-            ws.append([
-                stt,
-                profile.gpm_id,
-                profile.name,
-                '',
-                '',
-            ])
-            stt += 1
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Profiles & Playlists")
 
     # Auto adjust column widths
     column_widths = {
@@ -577,16 +569,28 @@ def export_excel(request):
     for col, width in column_widths.items():
         ws.column_dimensions[col].width = width
 
+    # Headers
+    header_font = Font(bold=True, size=12)
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    header_cells = []
+    for header in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in _export_rows():
+        ws.append(row)
+
     # Tạo response
-    output = BytesIO()
+    output = tempfile.TemporaryFile()
     wb.save(output)
     output.seek(0)
 
-    filename = f"youtube_profiles_playlists_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f"{filename}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    return response
\ No newline at end of file
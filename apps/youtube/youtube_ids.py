@@ -0,0 +1,38 @@
+"""Tách ID video/playlist từ link YouTube (dùng cho model, admin search và migration backfill)."""
+import re
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID_RE = re.compile(r"^[\w-]{11}$")
+# Playlist thường là PL + 32 ký tự (34), playlist album (OLAK5uy_...) dài 41
+PLAYLIST_ID_RE = re.compile(r"^(PL|UU|LL|FL|RD|OL)[\w-]{10,62}$")
+PLAYLIST_ID_MAX_LENGTH = 64
+
+
+def extract_video_id(link: str | None) -> str | None:
+    """watch?v=ID, youtu.be/ID, /shorts/ID, /embed/ID hoặc chính ID → ID 11 ký tự."""
+    if not link:
+        return None
+    link = link.strip()
+    if VIDEO_ID_RE.match(link):
+        return link
+    url = urlparse(link if "//" in link else f"https://{link}")
+    candidate = parse_qs(url.query).get("v", [None])[0]
+    if candidate is None:
+        parts = [part for part in url.path.split("/") if part]
+        if url.hostname and url.hostname.endswith("youtu.be") and parts:
+            candidate = parts[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            candidate = parts[1]
+    return candidate if candidate and VIDEO_ID_RE.match(candidate) else None
+
+
+def extract_playlist_id(link: str | None) -> str | None:
+    """Link có ?list=ID hoặc chính ID → ID playlist."""
+    if not link:
+        return None
+    link = link.strip()
+    if PLAYLIST_ID_RE.match(link):
+        return link
+    url = urlparse(link if "//" in link else f"https://{link}")
+    candidate = parse_qs(url.query).get("list", [None])[0]
+    return candidate if candidate and PLAYLIST_ID_RE.match(candidate) else None
@@ -0,0 +1,223 @@
+"""
+Điều tiết số trình duyệt GPM/Chrome mở đồng thời theo tài nguyên thực tế của máy.
+Trần YOUTUBE_MAX_BROWSERS tính chung cho mọi process trên máy: mỗi trình duyệt giữ lock 1 file slot
+trong BROWSER_SLOT_DIR, process chết thì hệ điều hành tự nhả lock.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # psutil là tuỳ chọn, fallback sang /proc và os.getloadavg
+    psutil = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Trần cứng số trình duyệt trên 1 máy (tính chung mọi process worker/web)
+MAX_BROWSERS = int(os.environ.get("YOUTUBE_MAX_BROWSERS", 15))
+# Thư mục chứa file lock của các slot trình duyệt, dùng chung giữa các process trên máy
+BROWSER_SLOT_DIR = os.environ.get(
+    "YOUTUBE_BROWSER_SLOT_DIR", os.path.join(tempfile.gettempdir(), "youtube-browser-slots")
+)
+# RAM trống tối thiểu (MB) để mở thêm 1 trình duyệt
+MIN_FREE_MEMORY_MB = int(os.environ.get("YOUTUBE_MIN_FREE_MEMORY_MB", 1500))
+# Tải CPU tối đa (0-1, đã chia cho số core) để mở thêm trình duyệt
+MAX_CPU_LOAD = float(os.environ.get("YOUTUBE_MAX_CPU_LOAD", 0.85))
+# Độ trễ trung bình (giây) của các bước chờ element; vượt ngưỡng thì giảm số trình duyệt
+LATENCY_TARGET = float(os.environ.get("YOUTUBE_LATENCY_TARGET", 5.0))
+# Trình duyệt vừa mở chưa chiếm hết RAM, trong khoảng này vẫn tính phần RAM dự trữ cho nó
+LAUNCH_WARMUP = 30
+BACKOFF_COOLDOWN = 30
+POLL_INTERVAL = 1.0
+
+
+def free_memory_mb() -> float | None:
+    """RAM còn dùng được (MB), None nếu không đo được."""
+    if psutil is not None:
+        return psutil.virtual_memory().available / (1024 * 1024)
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def cpu_load() -> float | None:
+    """Tải CPU hiện tại (0-1 trên toàn bộ core), None nếu không đo được."""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None) / 100
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def _try_lock(f) -> bool:
+    """Lock độc quyền không chờ trên file slot (flock/msvcrt, tự nhả khi process chết)."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+class AdmissionController:
+    """
+    Cấp "slot" mở trình duyệt: chỉ cho mở thêm khi còn dưới giới hạn hiện tại,
+    còn đủ RAM và CPU chưa quá tải. Giới hạn hiện tại tự giảm (nhân 0.7) khi độ trễ
+    các bước tăng vượt LATENCY_TARGET và tăng dần lại khi ổn định.
+    Slot là file lock trong slot_dir nên giới hạn được tính trên cả máy; active là số slot process này giữ.
+    """
+
+    def __init__(self, max_browsers: int = MAX_BROWSERS, min_free_memory_mb: int = MIN_FREE_MEMORY_MB,
+                 max_cpu_load: float = MAX_CPU_LOAD, latency_target: float = LATENCY_TARGET,
+                 slot_dir: str = BROWSER_SLOT_DIR):
+        self.max_browsers = max(1, max_browsers)
+        self.slot_dir = slot_dir
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_cpu_load = max_cpu_load
+        self.latency_target = latency_target
+        self.active = 0
+        self.limit = float(self.max_browsers)
+        self.latency = None
+        self._recent_launches = deque()
+        self._last_backoff = 0.0
+        self._slots = []
+        self._cond = threading.Condition()
+
+    def _lock_free_slot(self):
+        """Lock 1 file slot còn trống trong int(limit) slot đầu (None nếu cả máy đã đủ)."""
+        os.makedirs(self.slot_dir, exist_ok=True)
+        for index in range(int(self.limit)):
+            f = open(os.path.join(self.slot_dir, f"slot-{index}.lock"), "a+b")
+            if _try_lock(f):
+                return f
+            f.close()
+        return None
+
+    def _blocked_reason(self, probe: bool = True) -> str | None:
+        """
+        Lý do chưa được mở thêm trình duyệt (None nếu được phép). Gọi khi giữ _cond.
+        probe=False bỏ qua bước thử lock slot (acquire tự lock ngay sau đó).
+        """
+        if self.active >= int(self.limit):
+            return f"đã mở {self.active}/{int(self.limit)} trình duyệt"
+
+        now = time.monotonic()
+        while self._recent_launches and now - self._recent_launches[0] > LAUNCH_WARMUP:
+            self._recent_launches.popleft()
+        free_mb = free_memory_mb()
+        needed_mb = self.min_free_memory_mb * (1 + len(self._recent_launches))
+        if free_mb is not None and free_mb < needed_mb:
+            return f"RAM trống {free_mb:.0f}MB < {needed_mb}MB"
+
+        load = cpu_load()
+        if load is not None and load > self.max_cpu_load:
+            return f"CPU load {load:.2f} > {self.max_cpu_load}"
+
+        if probe:
+            slot = self._lock_free_slot()
+            if slot is None:
+                return f"máy đã mở đủ {int(self.limit)} trình duyệt"
+            _unlock(slot)
+        return None
+
+    def has_capacity(self) -> bool:
+        with self._cond:
+            return self._blocked_reason() is None
+
+    def wait_for_capacity(self, stop_event: threading.Event | None = None, timeout: float | None = None) -> bool:
+        """Chờ tới khi có thể mở thêm trình duyệt (không giữ slot)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.has_capacity():
+            if stop_event is not None and stop_event.is_set():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def acquire(self, on_wait=None):
+        """Giữ 1 slot, block tới khi tài nguyên cho phép. on_wait(reason) được gọi khi phải chờ."""
+        with self._cond:
+            reported = None
+            while True:
+                reason = self._blocked_reason(probe=False)
+                if reason is None:
+                    slot = self._lock_free_slot()
+                    if slot is not None:
+                        break
+                    reason = f"máy đã mở đủ {int(self.limit)} trình duyệt"
+                if on_wait and reason != reported:
+                    on_wait(reason)
+                    reported = reason
+                self._cond.wait(POLL_INTERVAL)
+            self._slots.append(slot)
+            self.active += 1
+            self._recent_launches.append(time.monotonic())
+
+    def release(self):
+        with self._cond:
+            if self._slots:
+                _unlock(self._slots.pop())
+            self.active = max(0, self.active - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, on_wait=None):
+        self.acquire(on_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_latency(self, seconds: float):
+        """Ghi độ trễ 1 bước chờ (EWMA) và điều chỉnh giới hạn theo kiểu AIMD."""
+        with self._cond:
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+            now = time.monotonic()
+            if self.latency > self.latency_target:
+                if now - self._last_backoff >= BACKOFF_COOLDOWN:
+                    self.limit = max(1.0, self.limit * 0.7)
+                    self._last_backoff = now
+            else:
+                self.limit = min(float(self.max_browsers), self.limit + 0.1)
+                self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "active": self.active,
+                "limit": int(self.limit),
+                "max_browsers": self.max_browsers,
+                "latency": self.latency,
+            }
+
+
+admission = AdmissionController()
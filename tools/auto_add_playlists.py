@@ -1,12 +1,15 @@
+import logging
 import os
 import sys
 import threading
 import time
+import uuid
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -14,14 +17,54 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from tools.admission import admission
+from tools.errors import (
+    BrowserAttachError,
+    ElementNotFoundError,
+    GPMBusyError,
+    JobError,
+    PageLoadError,
+    PlaylistUrlError,
+    ProfileStartError,
+    TransientError,
+    error_class,
+    is_transient,
+)
+from tools.gpm_client import GPMError, gpm
+from tools.job_logging import set_job_step, setup_logging
+from tools.metrics import BROWSER_LAUNCHES, DB_WRITE_DURATION, STEP_DURATION
+from tools.profile_lease import profile_leases
+
+# Đặt tên cố định để chạy trực tiếp file (__main__) vẫn dùng chung cấu hình log của "tools"
+logger = logging.getLogger("tools.auto_add_playlists")
+
 # Constants
 DJANGO_READY = False
 DEFAULT_TARGET_TOTAL = 100
-SCROLL_PAUSE = 5
 MAX_SCROLL_TIMES = 20
-GPM_API_BASE = "http://127.0.0.1:19995/api/v3/profiles"
-PROFILE_LOCKS = {}
-PROFILE_LOCK = threading.Lock()
+TOTAL_STEPS = 14
+# Timeout (giây) cho từng bước chờ; bước nào sẵn sàng sớm thì đi tiếp ngay
+GPM_START_TIMEOUT = 30
+GPM_CLOSE_TIMEOUT = 10
+PAGE_LOAD_TIMEOUT = 30
+# Không có video mới sau chừng này giây thì dừng scroll
+SCROLL_STALL_TIMEOUT = 5
+PLAYLIST_URL_TIMEOUT = 15
+POLL_INTERVAL = 0.25
+# Chạy bước 7-13 (chọn video → tạo playlist) bằng 1 script trong trang; lỗi thì làm tiếp từng bước.
+# Đặt YOUTUBE_SCRIPTED_DIALOG=0 để luôn chạy từng bước.
+SCRIPTED_DIALOG = os.environ.get("YOUTUBE_SCRIPTED_DIALOG", "1") != "0"
+# Span/metric của script có key riêng để không lẫn thời gian với bước 7 chạy lẻ
+SCRIPTED_DIALOG_STEP = "7-13"
+DIALOG_STEP_TIMEOUT = 10
+# Số lần chạy lại từ checkpoint gần nhất (cùng phiên trình duyệt) khi 1 bước lỗi
+MAX_RESUME_ATTEMPTS = 2
+# Số video mỗi lần bulk_create khi lưu danh sách video của playlist
+VIDEO_BATCH_SIZE = 500
 
 
 def setup_django():
@@ -32,25 +75,25 @@ def setup_django():
     try:
         from django.conf import settings
         if not settings.configured:
-            base_dir = Path(__file__).resolve().parents[1]
-            if str(base_dir) not in sys.path:
-                sys.path.append(str(base_dir))
             os.environ.setdefault("DJANGO_SETTINGS_MODULE", "youtubetoolsmanager.settings")
             import django
             django.setup()
         DJANGO_READY = True
     except Exception as e:
-        print("⚠️ Không khởi tạo được Django, bỏ qua lưu DB:", e)
+        logger.warning("⚠️ Không khởi tạo được Django, bỏ qua lưu DB: %s", e)
         DJANGO_READY = False
 
 
-def save_result(job: dict, playlist_url: str, number_of_videos: int | None = None):
-    """Ghi nhận kết quả vào DB."""
+def save_result(job: dict, playlist_url: str, number_of_videos: int | None = None, video_ids=()):
+    """Ghi nhận kết quả (profile, playlist và các video đã thêm vào playlist) vào DB."""
     setup_django()
     if not DJANGO_READY or not playlist_url:
         return
+    started = time.monotonic()
     try:
-        from apps.youtube.models import ProfileYoutube, PlaylistYoutube
+        from apps.youtube.models import ProfileYoutube, PlaylistYoutube, VideoYoutube
+        from apps.youtube.keyword_results import job_locale, record_keyword_result
+        from apps.youtube.stats import adjust_total
         profile_id = job.get("profile_id") or job.get("gpm_id")
         keyword = job.get("keyword") or ""
         playlist_title = job.get("playlist_title") or f"{keyword} autoplay"
@@ -71,7 +114,7 @@ def save_result(job: dict, playlist_url: str, number_of_videos: int | None = Non
         profile.is_done = True
         profile.save(update_fields=["is_done"])
 
-        PlaylistYoutube.objects.update_or_create(
+        playlist, _ = PlaylistYoutube.objects.update_or_create(
             profile=profile,
             name=playlist_title,
             defaults={
@@ -79,13 +122,109 @@ def save_result(job: dict, playlist_url: str, number_of_videos: int | None = Non
                 "number_of_videos": number_of_videos or 0,
             },
         )
+
+        # Video đã có trong playlist (chạy lại job) được bỏ qua; counter tổng video chỉ cộng số dòng thêm mới
+        if video_ids:
+            new_ids = list(dict.fromkeys(video_ids))
+            existing = set()
+            for start in range(0, len(new_ids), VIDEO_BATCH_SIZE):
+                existing.update(
+                    VideoYoutube.objects.filter(
+                        playlist=playlist, video_id__in=new_ids[start:start + VIDEO_BATCH_SIZE]
+                    ).values_list("video_id", flat=True)
+                )
+            new_ids = [video_id for video_id in new_ids if video_id not in existing]
+            # ignore_conflicts vẫn giữ để an toàn khi 2 job cùng ghi 1 playlist
+            VideoYoutube.objects.bulk_create(
+                [
+                    VideoYoutube(
+                        playlist=playlist,
+                        video_id=video_id,
+                        youtube_link=f"https://www.youtube.com/watch?v={video_id}",
+                    )
+                    for video_id in new_ids
+                ],
+                batch_size=VIDEO_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            adjust_total(VideoYoutube, len(new_ids))
+            record_keyword_result(keyword, job_locale(job), video_ids)
     except Exception as e:
-        print(f"⚠️ Lỗi lưu DB: {str(e).split(chr(10))[0]}")
+        logger.warning("⚠️ Lỗi lưu DB: %s", str(e).split("\n")[0])
+    finally:
+        DB_WRITE_DURATION.observe(time.monotonic() - started, operation="save_result")
 
 
 def log(thread_name: str, message: str):
-    """Helper để log với thread name."""
-    print(f"[{thread_name}] {message}")
+    """Helper để log với thread name (message bắt đầu bằng ⚠️ được ghi ở mức WARNING)."""
+    level = logging.WARNING if message.startswith("⚠️") else logging.INFO
+    logger.log(level, message, extra={"thread_name": thread_name})
+
+
+# Timer của job đang chạy trên thread hiện tại, để các helper ghi nhận số lần thử lại
+_step_context = threading.local()
+
+
+class StepTimer:
+    """
+    Đo thời gian từng bước của 1 job. Mỗi bước là 1 span
+    {"step", "label", "duration", "outcome", "retries"}, span trước kết thúc khi bước sau bắt đầu.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._current = None
+        self._started = None
+
+    def start(self, step: int | str, label: str):
+        self.finish()
+        self._current = {"step": step, "label": label, "duration": None, "outcome": None, "retries": 0}
+        self._started = time.monotonic()
+        self.spans.append(self._current)
+        set_job_step(step)
+
+    def retry(self):
+        if self._current is not None:
+            self._current["retries"] += 1
+
+    def finish(self, outcome: str = "ok"):
+        if self._current is None:
+            return
+        self._current["duration"] = round(time.monotonic() - self._started, 3)
+        self._current["outcome"] = outcome
+        STEP_DURATION.observe(self._current["duration"], step=self._current["step"], outcome=outcome)
+        logger.info(
+            "⏱️ Xong bước %s. %s", self._current["step"], self._current["label"],
+            extra={key: self._current[key] for key in ("step", "duration", "outcome", "retries")},
+        )
+        self._current = None
+
+
+def note_retry():
+    """Ghi nhận 1 lần thử lại (fallback selector, click JS, mở lại trình duyệt...) vào bước hiện tại."""
+    timer = getattr(_step_context, "timer", None)
+    if timer is not None:
+        timer.retry()
+
+
+def wait_until(condition, timeout: float, error_msg: str, error_type=TransientError):
+    """Poll condition() tới khi trả về truthy hoặc hết timeout (hết thì raise error_type)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        if time.monotonic() >= deadline:
+            raise error_type(error_msg)
+        time.sleep(POLL_INTERVAL)
+
+
+def is_cdp_reachable(remote_address: str) -> bool:
+    """Kiểm tra endpoint DevTools của trình duyệt đã phản hồi chưa."""
+    try:
+        return requests.get(f"http://{remote_address}/json/version", timeout=1).status_code == 200
+    except requests.RequestException:
+        return False
 
 
 def start_gpm_profile(profile_id: str, thread_name: str) -> tuple:
@@ -94,12 +233,12 @@ def start_gpm_profile(profile_id: str, thread_name: str) -> tuple:
     log(thread_name, "1. Đang gọi API để mở Profile GPM...")
     
     try:
-        resp = requests.get(f"{GPM_API_BASE}/start/{profile_id}").json()
-    except Exception as e:
-        raise Exception(f"Lỗi gọi API: {str(e).split(chr(10))[0]}")
+        resp = gpm.start_profile(profile_id)
+    except GPMError as e:
+        raise GPMBusyError(f"Lỗi gọi API: {e}") from e
 
     if not (resp.get("success") or resp.get("status") == "OK"):
-        raise Exception(f"GPM báo lỗi: {resp}")
+        raise ProfileStartError(f"GPM báo lỗi: {resp}")
 
     data = resp.get("data", {})
     remote_address = data.get("remote_debugging_address")
@@ -107,8 +246,13 @@ def start_gpm_profile(profile_id: str, thread_name: str) -> tuple:
 
     log(thread_name, f"✅ GPM đã mở tại: {remote_address}")
     log(thread_name, f"📂 Driver Path: {driver_path}")
-    log(thread_name, "⏳ Đang chờ trình duyệt khởi động ổn định (5s)...")
-    time.sleep(5)
+    log(thread_name, "⏳ Đang chờ trình duyệt sẵn sàng (CDP endpoint)...")
+    wait_until(
+        lambda: is_cdp_reachable(remote_address),
+        GPM_START_TIMEOUT,
+        f"⚠️ Trình duyệt không sẵn sàng sau {GPM_START_TIMEOUT}s ({remote_address})",
+        BrowserAttachError,
+    )
     
     return remote_address, driver_path
 
@@ -124,13 +268,14 @@ def create_driver(remote_address: str, driver_path: str, thread_name: str):
         log(thread_name, "🔗 Selenium đã móc vào trình duyệt thành công!")
         return driver
     except Exception as e:
-        raise Exception(f"Lỗi kết nối Selenium: {str(e).split(chr(10))[0]}")
+        raise BrowserAttachError(f"Lỗi kết nối Selenium: {str(e).split(chr(10))[0]}") from e
 
 
 def find_and_click(driver, selector: str = None, xpath: str = None, 
                    js_finder: str = None, error_msg: str = ""):
     """Helper để tìm và click element."""
     wait = WebDriverWait(driver, 10)
+    started = time.monotonic()
     
     try:
         if js_finder:
@@ -143,10 +288,13 @@ def find_and_click(driver, selector: str = None, xpath: str = None,
         try:
             btn.click()
         except:
+            note_retry()
             driver.execute_script("arguments[0].click();", btn)
         return True
     except Exception as e:
-        raise Exception(f"{error_msg}: {str(e).split(chr(10))[0]}")
+        raise ElementNotFoundError(f"{error_msg}: {str(e).split(chr(10))[0]}") from e
+    finally:
+        admission.record_latency(time.monotonic() - started)
 
 
 def open_youtube_tab(driver, thread_name: str):
@@ -155,7 +303,19 @@ def open_youtube_tab(driver, thread_name: str):
     driver.execute_script("window.open('https://www.youtube.com', '_blank');")
     driver.switch_to.window(driver.window_handles[-1])
     log(thread_name, "🌍 Đang thử truy cập YouTube...")
-    time.sleep(5)
+    started = time.monotonic()
+    try:
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script("""
+                return location.hostname.endsWith('youtube.com')
+                    && document.readyState === 'complete'
+                    && !!document.querySelector("input[name='search_query']");
+            """)
+        )
+    except Exception as e:
+        raise PageLoadError(f"⚠️ YouTube không tải xong sau {PAGE_LOAD_TIMEOUT}s: {str(e).split(chr(10))[0]}") from e
+    finally:
+        admission.record_latency(time.monotonic() - started)
 
 
 def click_extension_button(driver, thread_name: str):
@@ -175,63 +335,121 @@ def search_keyword(driver, keyword: str, thread_name: str):
         search_box.send_keys(Keys.ENTER)
         log(thread_name, f"✍️  Đã nhập '{keyword}' vào ô tìm kiếm.")
     except Exception as e:
-        raise Exception(f"⚠️ Không tìm thấy ô tìm kiếm: {str(e).split(chr(10))[0]}")
+        raise ElementNotFoundError(f"⚠️ Không tìm thấy ô tìm kiếm: {str(e).split(chr(10))[0]}") from e
 
 
-def get_total_count(driver):
-    """Lấy số phía sau dấu / trong yt-formatted-string#selection."""
-    raw = driver.execute_script("""
+def get_results_snapshot(driver) -> tuple:
+    """Trả về (số video đã render, text counter selection) trong 1 round trip."""
+    return tuple(driver.execute_script("""
         const el = document.querySelector("yt-formatted-string#selection");
-        return el ? el.textContent : null;
-    """)
-    if not raw:
-        return None
+        return [
+            document.querySelectorAll("ytd-video-renderer").length,
+            el ? el.textContent : null,
+        ];
+    """))
+
+
+# Chạy trong trang qua execute_async_script: tự scroll, theo dõi counter selection của extension
+# và gọi callback khi đủ target_total, không còn video mới trong stall_ms hoặc hết số lần scroll.
+# Hàm được gắn vào window 1 lần; lần chạy lại (resume) chỉ gọi lại hàm đã có.
+SCROLL_LOADER_JS = """
+const done = arguments[arguments.length - 1];
+if (!window.__ytmScrollLoader) {
+    window.__ytmScrollLoader = (targetTotal, loadTimeoutMs, stallMs, maxScrolls, pollMs, callback) => {
+        const readTotal = () => {
+            const el = document.querySelector("yt-formatted-string#selection");
+            const parts = el ? el.textContent.split("/") : [];
+            const total = parts.length === 2 ? parseInt(parts[1].trim(), 10) : NaN;
+            return Number.isNaN(total) ? null : total;
+        };
+        const countVideos = () => document.querySelectorAll("ytd-video-renderer").length;
+        const startedAt = Date.now();
+        let lastChangeAt = startedAt;
+        let lastVideos = -1;
+        let lastTotal = null;
+        let scrolls = 0;
+
+        const timer = setInterval(() => {
+            const now = Date.now();
+            const videos = countVideos();
+            const total = readTotal();
+            const finish = (reason) => {
+                clearInterval(timer);
+                callback({reason, videos, total, scrolls});
+            };
+
+            if (videos === 0) {
+                if (now - startedAt > loadTimeoutMs) finish("no_results");
+                return;
+            }
+            if (total !== null && total >= targetTotal) return finish("target");
+            if (videos !== lastVideos || total !== lastTotal) {
+                lastVideos = videos;
+                lastTotal = total;
+                lastChangeAt = now;
+                if (scrolls >= maxScrolls) return finish("max_scrolls");
+                window.scrollTo(0, document.documentElement.scrollHeight);
+                scrolls += 1;
+            } else if (now - lastChangeAt > stallMs) {
+                finish("stalled");
+            }
+        }, pollMs);
+    };
+}
+window.__ytmScrollLoader(arguments[0], arguments[1], arguments[2], arguments[3], arguments[4], done);
+"""
+
+
+def scroll_until_target(driver, thread_name: str, target_total: int,
+                        stall_timeout: float = SCROLL_STALL_TIMEOUT) -> int | None:
+    """
+    Scroll để load đủ video trong 1 lệnh WebDriver: script trong trang dừng ngay khi counter
+    selection đạt target_total hoặc không có video mới sau stall_timeout giây.
+    Trả về tổng video cuối cùng (nếu có).
+    """
+    # Script timeout đủ cho cả pha: chờ kết quả đầu tiên + mỗi lần scroll chờ tối đa stall_timeout
+    driver.set_script_timeout(PAGE_LOAD_TIMEOUT + (MAX_SCROLL_TIMES + 1) * stall_timeout + 10)
     try:
-        parts = raw.split("/")
-        return int(parts[1].strip()) if len(parts) == 2 else None
-    except:
-        return None
-
-
-def scroll_until_target(driver, thread_name: str, target_total: int) -> int | None:
-    """Scroll để load đủ video, hạn chế scroll thừa. Trả về tổng video cuối cùng (nếu có)."""
-    time.sleep(2)
-
-    # Kiểm tra ngay từ đầu nếu đã đủ
-    initial_total = get_total_count(driver)
-    if initial_total and initial_total >= target_total:
-        log(thread_name, f"✅ Tổng video ban đầu ({initial_total}) >= {target_total}, không cần scroll.")
-        return initial_total
-
-    last_height = 0
-    scroll_count = 0
-    latest_total = initial_total
-
-    while scroll_count < MAX_SCROLL_TIMES:
-        # Scroll xuống đáy
-        driver.execute_script("window.scrollTo({top: document.documentElement.scrollHeight, behavior: 'smooth'});")
-        time.sleep(SCROLL_PAUSE)
-
-        new_height = driver.execute_script("return document.documentElement.scrollHeight;")
-        total = get_total_count(driver)
-        latest_total = total if total is not None else latest_total
-
-        log(thread_name, f"📊 scroll #{scroll_count+1}, height={new_height}, total={total}")
-
-        if total and total >= target_total:
-            log(thread_name, f"✅ Tổng video ({total}) >= {target_total}, dừng scroll.")
-            break
-
-        if new_height == last_height:
-            log(thread_name, f"⚠️ scrollHeight không tăng nữa (={new_height}), dừng scroll.")
-            break
-
-        last_height = new_height
-        scroll_count += 1
-
-    if scroll_count >= MAX_SCROLL_TIMES:
+        result = driver.execute_async_script(
+            SCROLL_LOADER_JS,
+            target_total,
+            int(PAGE_LOAD_TIMEOUT * 1000),
+            int(stall_timeout * 1000),
+            MAX_SCROLL_TIMES,
+            int(POLL_INTERVAL * 1000),
+        )
+    except TimeoutException as e:
+        raise PageLoadError("⚠️ Scroll tải video quá thời gian") from e
+
+    reason, total = result["reason"], result["total"]
+    log(thread_name, f"📊 scroll x{result['scrolls']}, videos={result['videos']}, total={total}")
+    if reason == "no_results":
+        raise PageLoadError(f"⚠️ Không thấy kết quả tìm kiếm sau {PAGE_LOAD_TIMEOUT}s")
+    if reason == "target":
+        log(thread_name, f"✅ Tổng video ({total}) >= {target_total}, dừng scroll.")
+    elif reason == "stalled":
+        log(thread_name, f"⚠️ Không có video mới sau {stall_timeout}s, dừng scroll.")
+    else:
         log(thread_name, f"⚠️ Đã scroll tối đa {MAX_SCROLL_TIMES} lần.")
-    return latest_total
+    return total
+
+
+def get_video_ids(driver) -> list:
+    """ID các video đã tải trên trang kết quả (không trùng, theo thứ tự hiển thị) trong 1 round trip."""
+    return driver.execute_script("""
+        const ids = [];
+        const seen = new Set();
+        for (const a of document.querySelectorAll("ytd-video-renderer a#thumbnail[href]")) {
+            const url = new URL(a.href, location.origin);
+            const shorts = url.pathname.match(/^\\/shorts\\/([\\w-]{11})/);
+            const id = url.searchParams.get("v") || (shorts && shorts[1]);
+            if (id && id.length === 11 && !seen.has(id)) {
+                seen.add(id);
+                ids.push(id);
+            }
+        }
+        return ids;
+    """) or []
 
 
 def select_all_videos(driver, thread_name: str):
@@ -306,27 +524,32 @@ def fill_playlist_title(driver, playlist_title: str, thread_name: str):
             log(thread_name, f"✅ Đã điền tên playlist: {playlist_title}")
             return
         except:
+            note_retry()
             continue
     
-    raise Exception("⚠️ Không điền được tên playlist")
+    raise ElementNotFoundError("⚠️ Không điền được tên playlist")
 
 
 def set_visibility_public(driver, thread_name: str):
-    """Đặt playlist thành Public."""
-    # Mở dropdown
+    """Đặt playlist thành Public (đã Public thì thôi, dropdown đang mở thì không bấm lại)."""
     wait = WebDriverWait(driver, 10)
     visibility_dropdown = wait.until(EC.element_to_be_clickable(
         (By.CSS_SELECTOR, "div.ytDropdownViewModelDropdownContainer[role='combobox']")
     ))
-    visibility_dropdown.click()
-    log(thread_name, "✅ Đã mở dropdown Visibility.")
+    dialog_state = get_playlist_dialog_state(driver)
+    if dialog_state.get("public"):
+        log(thread_name, "✅ Visibility đã là Public/Công khai.")
+        return
+    if not dialog_state.get("dropdown_open"):
+        visibility_dropdown.click()
+        log(thread_name, "✅ Đã mở dropdown Visibility.")
 
-    # Chọn Public/Công khai
+    # Chọn Public/Công khai (chỉ xét các option của dropdown, không quét cả trang)
     js_finder = """
-        const nodes = Array.from(document.querySelectorAll('span, yt-formatted-string, div'));
-        return nodes.find(el => {
+        const options = Array.from(document.querySelectorAll("[role='option'], yt-list-item-view-model"));
+        return options.find(el => {
             const t = el.textContent.trim();
-            return t === 'Public' || t === 'Công khai';
+            return t.startsWith('Public') || t.startsWith('Công khai');
         }) || null;
     """
     public_el = wait.until(lambda d: d.execute_script(js_finder))
@@ -349,33 +572,192 @@ def click_create_button(driver, thread_name: str):
             log(thread_name, f"✅ Đã click nút Create/Tạo ({lang}).")
             return
         except:
+            note_retry()
             continue
     
-    raise Exception("⚠️ Không tìm thấy nút Create/Tạo")
+    raise ElementNotFoundError("⚠️ Không tìm thấy nút Create/Tạo")
+
+
+# Kiểm tra trạng thái hộp thoại tạo playlist, dùng chung cho script và các bước chạy lẻ
+# để bước chạy lại không bấm lại (vd. bấm lại select-all bỏ chọn video, bấm lại dropdown đóng nó).
+PLAYLIST_DIALOG_STATE_JS = """
+const textOf = (el) => (el.textContent || '').trim();
+const visible = (el) => !!el && el.offsetParent !== null;
+const selectAllButton = () => document.querySelector("yt-icon[icon='msfy:msfy-select-all']")?.closest('button') || null;
+const buttonWithText = (texts) => Array.from(document.querySelectorAll('button'))
+    .find(b => visible(b) && texts.some(t => textOf(b).includes(t))) || null;
+const titleBox = () => document.querySelector(
+    "div.ytStandardsTextareaShapeTextareaContainer textarea[placeholder='Choose a title'], " +
+    "div.ytStandardsTextareaShapeTextareaContainer textarea[placeholder='Chọn một tiêu đề']"
+);
+const visibilityDropdown = () => document.querySelector("div.ytDropdownViewModelDropdownContainer[role='combobox']");
+const isPublic = (el) => !!el && (textOf(el).startsWith('Public') || textOf(el).startsWith('Công khai'));
+const dialogState = () => {
+    const btn = selectAllButton();
+    const dropdown = visibilityDropdown();
+    return {
+        selected: !!btn && ['aria-pressed', 'aria-checked'].some(a => btn.getAttribute(a) === 'true'),
+        menu_open: visible(document.querySelector('div#msfy-action-add-to-playlist')),
+        playlist_dialog: !!buttonWithText(['New playlist', 'Danh sách phát mới']),
+        create_form: !!titleBox(),
+        dropdown_open: !!dropdown && dropdown.getAttribute('aria-expanded') === 'true',
+        public: isPublic(dropdown),
+    };
+};
+"""
+
+# Bước 7-13 trong 1 lệnh execute_async_script. Mỗi bước chờ element bằng selector cụ thể
+# (tối đa stepTimeoutMs) rồi click, bước đã ở đúng trạng thái thì bỏ qua.
+# Kết quả {"ok", "step", "error", "known_links", "selected", "timings"}: ok=false kèm step là bước
+# chưa làm được (các bước trước đó đã xong), timings là thời gian chờ (giây) của từng element.
+# Tiến độ được ghi vào window.__playlistDialog để Python huỷ script (xoá token) và biết nó đã làm tới đâu.
+PLAYLIST_DIALOG_JS = PLAYLIST_DIALOG_STATE_JS + """
+const [title, stepTimeoutMs, pollMs, token, alreadySelected] = arguments;
+const done = arguments[arguments.length - 1];
+const progress = window.__playlistDialog = {
+    token, step: 7, selected: !!alreadySelected, created: false, knownLinks: [], timings: [],
+};
+const cancelled = () => window.__playlistDialog !== progress || progress.token !== token;
+const waitFor = (find) => new Promise((resolve) => {
+    const started = Date.now();
+    const tick = () => {
+        const el = cancelled() ? null : find();
+        if (el || cancelled() || Date.now() - started > stepTimeoutMs) {
+            progress.timings.push((Date.now() - started) / 1000);
+            return resolve(el);
+        }
+        setTimeout(tick, pollMs);
+    };
+    tick();
+});
+const playlistLinks = () =>
+    Array.from(document.querySelectorAll("a[href^='/playlist?list=']")).map(a => a.href);
+const result = (ok, error) => ({
+    ok, step: progress.step, error, known_links: progress.knownLinks,
+    selected: progress.selected, timings: progress.timings,
+});
+
+// [bước, đã xong?, tìm element, thao tác (mặc định click)]
+const steps = [
+    [7, () => progress.selected || dialogState().selected, selectAllButton, null],
+    [8, () => { const s = dialogState(); return s.menu_open || s.playlist_dialog || s.create_form; },
+        () => document.querySelector("yt-icon[icon='more_vert']")?.closest('button'), null],
+    [9, () => { const s = dialogState(); return s.playlist_dialog || s.create_form; },
+        () => document.querySelector('div#msfy-action-add-to-playlist'), null],
+    [10, () => dialogState().create_form, () => buttonWithText(['New playlist', 'Danh sách phát mới']), null],
+    [11, () => false, titleBox, (ta) => {
+        ta.focus();
+        const setter = Object.getOwnPropertyDescriptor(HTMLTextAreaElement.prototype, 'value').set;
+        setter.call(ta, title);
+        ta.dispatchEvent(new Event('input', {bubbles: true}));
+        ta.dispatchEvent(new Event('change', {bubbles: true}));
+    }],
+    [12, () => { const s = dialogState(); return s.public || s.dropdown_open; }, visibilityDropdown, null],
+    [12, () => dialogState().public, () => Array.from(document.querySelectorAll("[role='option'], yt-list-item-view-model"))
+        .find(isPublic) || null, null],
+    [13, () => false, () => document.querySelector(
+        ".yt-spec-dialog-layout__dialog-layout-footer-container button[aria-label='Create'], " +
+        ".yt-spec-dialog-layout__dialog-layout-footer-container button[aria-label='Tạo']"
+    ), null],
+];
+
+(async () => {
+    for (const [step, isDone, find, action] of steps) {
+        progress.step = step;
+        if (isDone()) continue;
+        const el = await waitFor(find);
+        // Kiểm tra huỷ ngay trước khi thao tác (cùng 1 lượt chạy JS nên không bị chen giữa)
+        if (cancelled()) return done(result(false, 'cancelled'));
+        if (!el) return done(result(false, 'element not found'));
+        if (step === 13) progress.knownLinks = playlistLinks();
+        el.scrollIntoView({block: 'center'});
+        if (action) action(el); else el.click();
+        if (step === 7) progress.selected = true;
+        if (step === 13) progress.created = true;
+    }
+    done(result(true, null));
+})().catch(e => done(result(false, String(e))));
+"""
+
+# Huỷ script đang chạy (nếu còn) và trả về tiến độ của nó
+CANCEL_PLAYLIST_DIALOG_JS = """
+const progress = window.__playlistDialog;
+if (!progress) return null;
+progress.token = null;
+return {step: progress.step, selected: progress.selected, created: progress.created,
+        known_links: progress.knownLinks};
+"""
+
+
+def get_playlist_dialog_state(driver) -> dict:
+    """Trạng thái hiện tại của hộp thoại tạo playlist (xem PLAYLIST_DIALOG_STATE_JS)."""
+    return driver.execute_script(PLAYLIST_DIALOG_STATE_JS + "return dialogState();") or {}
+
+
+def run_playlist_dialog_script(driver, playlist_title: str, thread_name: str, selected: bool = False) -> dict:
+    """
+    Chạy bước 7-13 trong 1 round trip; trả về kết quả của PLAYLIST_DIALOG_JS.
+    selected=True khi video đã được chọn ở lần chạy trước (không bấm lại select-all).
+    """
+    driver.set_script_timeout(DIALOG_STEP_TIMEOUT * 8 + 5)
+    try:
+        result = driver.execute_async_script(
+            PLAYLIST_DIALOG_JS, playlist_title, DIALOG_STEP_TIMEOUT * 1000, int(POLL_INTERVAL * 1000),
+            uuid.uuid4().hex, selected,
+        )
+    except TimeoutException as e:
+        # Script có thể vẫn chạy trong trang và bấm Create: huỷ trước khi chạy từng bước
+        progress = driver.execute_script(CANCEL_PLAYLIST_DIALOG_JS) or {}
+        result = {
+            "ok": bool(progress.get("created")),
+            "step": progress.get("step"),
+            "error": str(e).split(chr(10))[0],
+            "known_links": progress.get("known_links", []),
+            "selected": progress.get("selected", selected),
+            "timings": [DIALOG_STEP_TIMEOUT],
+        }
+    # Độ trễ cho admission tính theo từng element như các bước chạy lẻ, không tính cả script
+    for seconds in result.get("timings", []):
+        admission.record_latency(seconds)
+    if result["ok"]:
+        log(thread_name, f"✅ Đã tạo playlist bằng script: {playlist_title}")
+    return result
 
 
-def get_playlist_url(driver, profile_id: str, thread_name: str) -> str:
-    """Lấy URL playlist vừa tạo."""
-    time.sleep(3)
-    
-    playlist_url = WebDriverWait(driver, 10).until(
-        lambda d: d.execute_script("""
-            const links = Array.from(document.querySelectorAll("a[href^='/playlist?list=']"));
-            if (!links.length) return null;
-            const last = links[links.length - 1];
-            return last.href;
-        """)
-    )
+def get_playlist_links(driver) -> list:
+    """Danh sách link playlist đang có trên trang."""
+    return driver.execute_script("""
+        return Array.from(document.querySelectorAll("a[href^='/playlist?list=']")).map(a => a.href);
+    """) or []
+
+
+def get_playlist_url(driver, profile_id: str, thread_name: str, known_links=()) -> str:
+    """Lấy URL playlist vừa tạo (link mới xuất hiện so với known_links)."""
+    known_links = set(known_links)
+
+    def new_playlist_link(d):
+        links = get_playlist_links(d)
+        fresh = [link for link in links if link not in known_links]
+        return fresh[-1] if fresh else None
+
+    try:
+        playlist_url = WebDriverWait(driver, PLAYLIST_URL_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+            new_playlist_link
+        )
+    except Exception:
+        # Fallback: link playlist cuối cùng trên trang như trước
+        links = get_playlist_links(driver)
+        playlist_url = links[-1] if links else None
     
     if not playlist_url:
-        raise Exception(f"⚠️ Không lấy được link playlist cho profile {profile_id}")
+        raise PlaylistUrlError(f"⚠️ Không lấy được link playlist cho profile {profile_id}")
     
     log(thread_name, f"🔗 Playlist mới của profile {profile_id}: {playlist_url}")
     return playlist_url
 
 
-def cleanup(driver, profile_id: str, thread_name: str):
-    """Đóng driver và stop GPM profile."""
+def cleanup(driver, profile_id: str, thread_name: str, remote_address: str | None = None):
+    """Đóng driver, stop GPM profile và chờ trình duyệt thoát hẳn."""
     # Đóng driver
     try:
         if driver:
@@ -386,17 +768,150 @@ def cleanup(driver, profile_id: str, thread_name: str):
     
     # Stop GPM
     try:
-        resp = requests.get(f"{GPM_API_BASE}/close/{profile_id}", timeout=5)
-        if resp.status_code == 200:
-            log(thread_name, f"🔒 Đã gọi API stop GPM profile {profile_id}.")
-        else:
-            log(thread_name, f"⚠️ GPM API stop trả về status {resp.status_code}.")
-    except Exception as e:
+        gpm.close_profile(profile_id)
+        log(thread_name, f"🔒 Đã gọi API stop GPM profile {profile_id}.")
+    except GPMError as e:
         log(thread_name, f"⚠️ Không thể gọi API stop GPM: {e}")
 
+    # Chờ CDP endpoint ngừng phản hồi để job khác cùng profile không mở trùng trình duyệt
+    if remote_address:
+        try:
+            wait_until(
+                lambda: not is_cdp_reachable(remote_address),
+                GPM_CLOSE_TIMEOUT,
+                f"⚠️ Trình duyệt chưa đóng hẳn sau {GPM_CLOSE_TIMEOUT}s",
+            )
+        except Exception as e:
+            log(thread_name, str(e))
+
+
+class BrowserSession:
+    """
+    Phiên trình duyệt của 1 GPM profile: mở GPM + attach driver một lần,
+    chạy nhiều job liên tiếp (mỗi job 1 tab mới), chỉ đóng profile khi close().
+    """
+
+    def __init__(self, profile_id: str, thread_name: str | None = None):
+        self.profile_id = profile_id
+        self.thread_name = thread_name or threading.current_thread().name
+        self.driver = None
+        self.remote_address = None
+        self._lease = None
+        self._has_slot = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_alive(self) -> bool:
+        try:
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def ensure_open(self, on_step=None):
+        """
+        Mở GPM + driver nếu chưa mở (hoặc mở lại nếu trình duyệt đã chết).
+        on_step(2, label) được gọi trước khi attach Selenium để tách thời gian của 2 bước.
+        """
+        if self.driver is not None:
+            if self.is_alive():
+                return self.driver
+            log(self.thread_name, "⚠️ Trình duyệt không còn phản hồi, mở lại profile.")
+            note_retry()
+            self._shutdown()
+
+        if self._lease is None:
+            # Lease dùng chung giữa các process: job cùng profile (kể cả ở web/CLI khác) xếp hàng lần lượt
+            setup_django()
+            self._lease = profile_leases.acquire(
+                self.profile_id,
+                on_wait=lambda holder: log(
+                    self.thread_name, f"⏳ Profile {self.profile_id} đang được dùng bởi {holder}, xếp hàng chờ."
+                ),
+            )
+            log(self.thread_name, f"🔒 Đã giữ lease cho profile {self.profile_id}, sẽ chạy tuần tự.")
+
+        if not self._has_slot:
+            # Chỉ mở thêm Chrome khi máy còn đủ RAM/CPU và dưới trần số trình duyệt
+            admission.acquire(
+                on_wait=lambda reason: log(self.thread_name, f"⏳ Chờ tài nguyên để mở trình duyệt: {reason}")
+            )
+            self._has_slot = True
+
+        try:
+            # 1. Mở GPM
+            self.remote_address, driver_path = start_gpm_profile(self.profile_id, self.thread_name)
+
+            # 2. Tạo driver
+            if on_step is not None:
+                on_step(2, "Kết nối Selenium")
+            self.driver = create_driver(self.remote_address, driver_path, self.thread_name)
+        except Exception:
+            BROWSER_LAUNCHES.inc(outcome="error")
+            raise
+        BROWSER_LAUNCHES.inc(outcome="ok")
+        return self.driver
+
+    def close_tab(self, handle: str | None):
+        """Đóng tab của job, giữ lại tab ban đầu để trình duyệt không tự thoát."""
+        if not handle or self.driver is None:
+            return
+        try:
+            if len(self.driver.window_handles) > 1:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(self.driver.window_handles[0])
+        except Exception as e:
+            log(self.thread_name, f"⚠️ Lỗi khi đóng tab: {str(e).split(chr(10))[0]}")
+
+    def _shutdown(self):
+        cleanup(self.driver, self.profile_id, self.thread_name, self.remote_address)
+        self.driver = None
+        self.remote_address = None
+
+    def close(self):
+        """Đóng driver + stop GPM profile và trả lease cho job khác."""
+        if self._lease is None:
+            return
+        try:
+            self._shutdown()
+        finally:
+            if self._has_slot:
+                admission.release()
+                self._has_slot = False
+            profile_leases.release(self._lease)
+            self._lease = None
+
+
+def dismiss_dialogs(driver):
+    """Đóng dialog/menu đang mở (Escape) để quay về trang kết quả tìm kiếm."""
+    for _ in range(2):
+        try:
+            driver.switch_to.active_element.send_keys(Keys.ESCAPE)
+        except Exception:
+            break
+        time.sleep(POLL_INTERVAL)
+
+
+def run_for_profile(job: dict, session: BrowserSession | None = None, on_step=None,
+                    timer: StepTimer | None = None, on_checkpoint=None):
+    """
+    Chạy toàn bộ flow YouTube cho 1 profile.
+    Truyền session để chạy trong trình duyệt đã mở sẵn của profile (không mở/đóng GPM).
+    on_step(step, label) được gọi khi bắt đầu mỗi bước (1..TOTAL_STEPS) để báo tiến độ.
+    timer (nếu có) nhận thời gian/kết quả/số lần thử lại của từng bước, kể cả khi job lỗi.
+    on_checkpoint(name, data) được gọi khi đạt checkpoint (searched/loaded/playlist_created).
+    Bước lỗi được chạy lại từ checkpoint gần nhất trong cùng phiên trình duyệt
+    (tối đa MAX_RESUME_ATTEMPTS lần) thay vì làm lại từ đầu.
+    """
+    if session is None:
+        with BrowserSession(job["profile_id"]) as own_session:
+            return run_for_profile(job, own_session, on_step, timer, on_checkpoint)
 
-def run_for_profile(job: dict):
-    """Chạy toàn bộ flow YouTube cho 1 profile."""
     profile_id = job["profile_id"]
     keyword = job["keyword"]
     playlist_title = job.get("playlist_title") or f"{keyword} autoplay"
@@ -407,72 +922,189 @@ def run_for_profile(job: dict):
             target_total = DEFAULT_TARGET_TOTAL
     except (TypeError, ValueError):
         target_total = DEFAULT_TARGET_TOTAL
-    thread_name = threading.current_thread().name
-    driver = None
-    lock = None
+    thread_name = session.thread_name
+    tab = None
+    checkpoint = None
+    state = {}
+
+    def report(step: int, label: str):
+        if timer is not None:
+            timer.start(step, label)
+            # Bước đầu tiên chạy lại sau checkpoint được tính là 1 lần thử lại
+            if state.pop("resumed", False):
+                timer.retry()
+        if on_step is None:
+            return
+        try:
+            on_step(step, label)
+        except Exception as e:  # báo tiến độ lỗi không được làm hỏng job
+            log(thread_name, f"⚠️ Lỗi báo tiến độ: {str(e).split(chr(10))[0]}")
+
+    def reach(name: str, **data):
+        nonlocal checkpoint
+        checkpoint = name
+        log(thread_name, f"📍 Checkpoint: {name} {data or ''}")
+        if on_checkpoint is None:
+            return
+        try:
+            on_checkpoint(name, data)
+        except Exception as e:
+            log(thread_name, f"⚠️ Lỗi lưu checkpoint: {str(e).split(chr(10))[0]}")
+
+    def search(driver):
+        nonlocal tab
+        # Làm lại từ đầu trong tab mới, tab cũ (nếu có) có thể đang ở trạng thái lỗi
+        session.close_tab(tab)
+        tab = None
+        state.pop("selected", None)
 
-    try:
-        with PROFILE_LOCK:
-            if profile_id not in PROFILE_LOCKS:
-                PROFILE_LOCKS[profile_id] = threading.Lock()
-            lock = PROFILE_LOCKS[profile_id]
-        # blocking=True để các job cùng profile_id xếp hàng, không bị bỏ qua
-        lock.acquire(blocking=True)
-        log(thread_name, f"🔒 Đã giữ lock cho profile {profile_id}, sẽ chạy tuần tự.")
-
-        # 1. Mở GPM
-        remote_address, driver_path = start_gpm_profile(profile_id, thread_name)
-        
-        # 2. Tạo driver
-        driver = create_driver(remote_address, driver_path, thread_name)
-        
         # 3. Mở YouTube
+        report(3, "Mở YouTube")
         open_youtube_tab(driver, thread_name)
-        
+        tab = driver.current_window_handle
+
         # 4. Click extension
+        report(4, "Mở extension")
         click_extension_button(driver, thread_name)
-        
+
         # 5. Search
+        report(5, "Tìm kiếm keyword")
         search_keyword(driver, keyword, thread_name)
-        
-        # 6. Scroll để load video
-        total_videos = scroll_until_target(driver, thread_name, target_total)
-        
-        # 7. Select all
-        select_all_videos(driver, thread_name)
-        
-        # 8. Mở menu
-        open_more_menu(driver, thread_name)
-        
-        # 9. Add to playlist
-        add_to_playlist(driver, thread_name)
-        
-        # 10. New playlist
-        click_new_playlist(driver, thread_name)
-        
-        # 11. Điền tên
-        fill_playlist_title(driver, playlist_title, thread_name)
-        
-        # 12. Set public
-        set_visibility_public(driver, thread_name)
-        
-        # 13. Create
-        click_create_button(driver, thread_name)
-        
+        reach("searched", keyword=keyword)
+
+    def load_videos(driver):
+        # 6. Scroll để load video (chạy lại thì tiếp tục từ số video đã có trên trang)
+        report(6, "Scroll tải video")
+        state["total_videos"] = scroll_until_target(driver, thread_name, target_total)
+        # Lấy luôn ID các video đã tải (chính là các video sẽ được chọn vào playlist)
+        state["video_ids"] = get_video_ids(driver)
+        reach("loaded", videos=state["total_videos"], video_ids=len(state["video_ids"]))
+
+    def create_playlist(driver):
+        start_step = 7
+        if SCRIPTED_DIALOG:
+            # 7-13. Cả chuỗi chọn video → tạo playlist trong 1 script
+            report(SCRIPTED_DIALOG_STEP, "Tạo playlist bằng script")
+            result = run_playlist_dialog_script(driver, playlist_title, thread_name, state.get("selected", False))
+            state["selected"] = state.get("selected") or result.get("selected", False)
+            if result["ok"]:
+                state["known_links"] = result["known_links"]
+                reach("playlist_created", title=playlist_title)
+                return
+            if timer is not None:
+                timer.finish("error")
+            if result["step"] is None:
+                # Không rõ script dừng ở đâu: để vòng resume chạy lại từ checkpoint "loaded"
+                raise ElementNotFoundError(f"⚠️ Script tạo playlist lỗi: {result['error']}")
+            start_step = result["step"]
+            log(thread_name, f"⚠️ Script tạo playlist dừng ở bước {start_step}, làm tiếp từng bước.")
+
+        def select_all(driver):
+            # Bấm lại select-all sẽ bỏ chọn các video đã chọn
+            if state.get("selected") or get_playlist_dialog_state(driver).get("selected"):
+                log(thread_name, "✅ Video đã được chọn sẵn, bỏ qua select all.")
+            else:
+                select_all_videos(driver, thread_name)
+            state["selected"] = True
+
+        def create(driver):
+            state["known_links"] = get_playlist_links(driver)
+            click_create_button(driver, thread_name)
+
+        # (bước, tên, đã xong?, thao tác): bước đã ở đúng trạng thái (chạy lại sau lỗi) thì bỏ qua
+        dialog_steps = [
+            (7, "Chọn tất cả video", None, select_all),
+            (8, "Mở menu", lambda s: s.get("menu_open") or s.get("playlist_dialog") or s.get("create_form"),
+             lambda d: open_more_menu(d, thread_name)),
+            (9, "Thêm vào playlist", lambda s: s.get("playlist_dialog") or s.get("create_form"),
+             lambda d: add_to_playlist(d, thread_name)),
+            (10, "Tạo playlist mới", lambda s: s.get("create_form"), lambda d: click_new_playlist(d, thread_name)),
+            (11, "Điền tên playlist", None, lambda d: fill_playlist_title(d, playlist_title, thread_name)),
+            (12, "Đặt công khai", None, lambda d: set_visibility_public(d, thread_name)),
+            (13, "Bấm tạo playlist", None, create),
+        ]
+        for step, label, is_done, action in dialog_steps:
+            if step < start_step:
+                continue
+            report(step, label)
+            if is_done is not None and is_done(get_playlist_dialog_state(driver)):
+                log(thread_name, f"✅ Bước {step} đã xong từ trước, bỏ qua.")
+                continue
+            action(driver)
+        # Từ đây không được tạo lại playlist, chỉ lấy lại URL
+        reach("playlist_created", title=playlist_title)
+
+    def capture_url(driver):
         # 14. Lấy URL và lưu
-        playlist_url = get_playlist_url(driver, profile_id, thread_name)
-        save_result(job, playlist_url, number_of_videos=total_videos or 0)
+        report(14, "Lấy link playlist")
+        playlist_url = get_playlist_url(driver, profile_id, thread_name, state.get("known_links", ()))
+        save_result(
+            job, playlist_url,
+            number_of_videos=state.get("total_videos") or 0,
+            video_ids=state.get("video_ids", ()),
+        )
+
+    def resume_point(driver):
+        """Checkpoint an toàn để chạy tiếp; trang kết quả mất video thì phải tìm kiếm lại."""
+        if checkpoint in ("searched", "loaded"):
+            dismiss_dialogs(driver)
+            if get_results_snapshot(driver)[0] == 0:
+                return None
+        return checkpoint
+
+    _step_context.timer = timer
+    try:
+        # 1-2. Mở GPM + tạo driver (bỏ qua nếu phiên đã mở)
+        report(1, "Mở GPM profile")
+        driver = session.ensure_open(on_step=report)
+
+        attempts = 0
+        while True:
+            try:
+                if checkpoint is None:
+                    search(driver)
+                if checkpoint == "searched":
+                    load_videos(driver)
+                if checkpoint == "loaded":
+                    create_playlist(driver)
+                capture_url(driver)
+                break
+            except Exception as e:
+                if attempts >= MAX_RESUME_ATTEMPTS or not session.is_alive():
+                    raise
+                attempts += 1
+                if timer is not None:
+                    timer.finish("error")
+                state["resumed"] = True
+                checkpoint = resume_point(driver)
+                log(
+                    thread_name,
+                    f"⚠️ Lỗi: {str(e).split(chr(10))[0]} → chạy lại từ checkpoint "
+                    f"{checkpoint or 'đầu'} (lần {attempts}/{MAX_RESUME_ATTEMPTS})",
+                )
+
+        if timer is not None:
+            timer.finish("ok")
 
     except Exception as e:
+        if timer is not None:
+            timer.finish("error")
         error_msg = f"[{thread_name}] 💥 Lỗi: {str(e).split(chr(10))[0]}"
-        print(error_msg)
-        raise Exception(error_msg) from None
+        logger.error(error_msg, extra={"error_class": error_class(e)})
+        raise JobError(error_msg, transient=is_transient(e), error_class=error_class(e)) from e
     finally:
-        cleanup(driver, profile_id, thread_name)
-        # Nghỉ ngắn để GPM kịp đóng hẳn trước khi job khác cùng profile chạy
-        time.sleep(2)
-        if lock:
-            lock.release()
+        _step_context.timer = None
+        session.close_tab(tab)
+
+
+def run_jobs_for_profile(jobs: list):
+    """Chạy lần lượt các job cùng profile trong 1 lần mở trình duyệt."""
+    with BrowserSession(jobs[0]["profile_id"]) as session:
+        for job in jobs:
+            try:
+                run_for_profile(job, session)
+            except Exception as e:
+                logger.error("❌ Worker bị lỗi: %s", e)
 
 
 # ================= MULTITHREAD ENTRYPOINT =================
@@ -490,16 +1122,22 @@ JOBS = [
 
 
 def main():
-    max_workers = min(len(JOBS), 4)
+    setup_logging()
+    # Gom job theo profile để mỗi profile chỉ mở trình duyệt 1 lần
+    jobs_by_profile = {}
+    for job in JOBS:
+        jobs_by_profile.setdefault(job["profile_id"], []).append(job)
+
+    max_workers = min(len(jobs_by_profile), 4)
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(run_for_profile, job) for job in JOBS]
+        futures = [executor.submit(run_jobs_for_profile, jobs) for jobs in jobs_by_profile.values()]
         
         for f in futures:
             try:
                 f.result()
             except Exception as e:
-                print("❌ Worker bị lỗi:", e)
+                logger.error("❌ Worker bị lỗi: %s", e)
 
 
 if __name__ == "__main__":
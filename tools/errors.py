@@ -0,0 +1,91 @@
+"""Các loại lỗi của tool và phân loại lỗi tạm thời (nên thử lại) / vĩnh viễn."""
+import requests
+from selenium.common.exceptions import (
+    InvalidArgumentException,
+    NoSuchWindowException,
+    TimeoutException,
+    WebDriverException,
+)
+
+
+class ToolError(Exception):
+    """Lỗi của 1 bước trong flow; transient=True nghĩa là chạy lại sau có thể thành công."""
+    transient = False
+
+
+class TransientError(ToolError):
+    transient = True
+
+
+class PermanentError(ToolError):
+    transient = False
+
+
+class GPMBusyError(TransientError):
+    """GPM không phản hồi/đang quá tải khi mở hoặc đóng profile."""
+
+
+class ProfileStartError(PermanentError):
+    """GPM từ chối mở profile (profile không tồn tại, hết hạn...)."""
+
+
+class BrowserAttachError(TransientError):
+    """Trình duyệt chưa sẵn sàng hoặc Selenium không attach được (race khi vừa mở)."""
+
+
+class PageLoadError(TransientError):
+    """Trang YouTube/kết quả tìm kiếm tải quá chậm (thường do proxy)."""
+
+
+class ElementNotFoundError(TransientError):
+    """Không tìm thấy element sau khi chờ; lặp lại nhiều lần thường là YouTube đổi giao diện."""
+
+
+class PlaylistUrlError(PermanentError):
+    """Đã bấm tạo playlist nhưng không lấy được URL; không chạy lại để tránh tạo trùng playlist."""
+
+
+class JobError(Exception):
+    """Lỗi cuối cùng của 1 job, kèm phân loại để worker quyết định có thử lại hay không."""
+
+    def __init__(self, message: str, transient: bool = False, error_class: str = ""):
+        super().__init__(message)
+        self.transient = transient
+        self.error_class = error_class
+
+
+# Lỗi của thư viện ngoài được coi là tạm thời
+TRANSIENT_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, TimeoutException, ConnectionError)
+PERMANENT_EXCEPTIONS = (InvalidArgumentException, NoSuchWindowException)
+
+
+def _cause_chain(exc):
+    while exc is not None:
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Lỗi gần nhất có phân loại trong chuỗi nguyên nhân quyết định; không rõ thì coi là vĩnh viễn."""
+    for item in _cause_chain(exc):
+        if isinstance(item, (ToolError, JobError)):
+            return item.transient
+        if isinstance(item, PERMANENT_EXCEPTIONS):
+            return False
+        if isinstance(item, TRANSIENT_EXCEPTIONS):
+            return True
+        if isinstance(item, WebDriverException):
+            # Các lỗi WebDriver khác (mất kết nối tới trình duyệt...) thường hết khi chạy lại
+            return True
+    return False
+
+
+def error_class(exc: BaseException) -> str:
+    """Tên loại lỗi: lỗi của tool nếu có, ngược lại là lỗi gốc (vd. TimeoutException)."""
+    chain = list(_cause_chain(exc))
+    for item in chain:
+        if isinstance(item, JobError) and item.error_class:
+            return item.error_class
+        if isinstance(item, ToolError):
+            return type(item).__name__
+    return type(chain[-1]).__name__
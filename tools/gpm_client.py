@@ -0,0 +1,133 @@
+"""Client dùng chung cho GPM local API: pool kết nối, timeout theo endpoint, retry và circuit breaker."""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tools.metrics import GPM_REQUEST_DURATION
+
+GPM_API_BASE = os.environ.get("GPM_API_BASE", "http://127.0.0.1:19995/api/v3/profiles")
+# Số kết nối keep-alive giữ sẵn tới GPM (nên >= số worker chạy song song)
+POOL_SIZE = int(os.environ.get("GPM_POOL_SIZE", 32))
+
+# (connect timeout, read timeout) theo endpoint; start phải chờ GPM bật trình duyệt nên lâu hơn
+TIMEOUTS = {
+    "list": (3, 15),
+    "start": (3, 60),
+    "close": (3, 10),
+}
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 5.0
+# Lỗi liên tiếp quá ngưỡng thì ngắt mạch, ngừng gọi GPM trong BREAKER_RESET_TIMEOUT giây
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+
+class GPMError(Exception):
+    """Lỗi khi gọi GPM API."""
+
+
+class GPMUnavailable(GPMError):
+    """GPM đang quá tải/không phản hồi, circuit breaker đang mở."""
+
+
+class CircuitBreaker:
+    """
+    Đếm lỗi liên tiếp; vượt ngưỡng thì "mở mạch" và từ chối ngay mọi request.
+    Hết thời gian chờ thì cho 1 request thử (half-open): thành công thì đóng mạch lại.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._trial_running:
+                raise GPMUnavailable(f"GPM đang quá tải, tạm ngừng gọi API (còn {max(remaining, 0):.0f}s)")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GPMClient:
+    """Gọi GPM API qua 1 requests.Session dùng chung (an toàn khi gọi từ nhiều thread)."""
+
+    def __init__(self, base_url: str = GPM_API_BASE, pool_size: int = POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker()
+
+    def _request(self, endpoint: str, path: str = "", idempotent: bool = True) -> dict:
+        """
+        Gọi GET {base_url}{path} và trả về JSON.
+        Retry (backoff + jitter) khi lỗi kết nối/timeout/5xx; endpoint không idempotent (start)
+        chỉ retry khi request chưa tới được GPM để tránh mở trình duyệt 2 lần.
+        """
+        url = f"{self.base_url}{path}"
+        timeout = TIMEOUTS[endpoint]
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                resp = self.session.get(url, timeout=timeout)
+                if resp.status_code >= 500:
+                    raise requests.HTTPError(f"GPM trả về status {resp.status_code}", response=resp)
+                self.breaker.record_success()
+                GPM_REQUEST_DURATION.observe(time.monotonic() - started, endpoint=endpoint, outcome="ok")
+            except requests.RequestException as e:
+                GPM_REQUEST_DURATION.observe(time.monotonic() - started, endpoint=endpoint, outcome="error")
+                self.breaker.record_failure()
+                retryable = idempotent or isinstance(e, requests.ConnectionError)
+                if not retryable or attempt >= MAX_RETRIES:
+                    message = str(e).split("\n")[0] or e.__class__.__name__
+                    raise GPMError(f"Lỗi gọi GPM {endpoint}: {message}") from e
+                attempt += 1
+                time.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt)))
+                continue
+
+            if resp.status_code >= 400:
+                raise GPMError(f"GPM {endpoint} trả về status {resp.status_code}")
+            try:
+                return resp.json()
+            except ValueError as e:
+                raise GPMError(f"GPM {endpoint} trả về dữ liệu không phải JSON") from e
+
+    def list_profiles(self) -> dict:
+        return self._request("list")
+
+    def start_profile(self, profile_id: str) -> dict:
+        return self._request("start", f"/start/{profile_id}", idempotent=False)
+
+    def close_profile(self, profile_id: str) -> dict:
+        return self._request("close", f"/close/{profile_id}")
+
+
+gpm = GPMClient()
@@ -0,0 +1,127 @@
+"""
+Log có cấu trúc (JSON lines) cho tool và worker.
+Thread gọi logger chỉ đẩy record vào queue, việc ghi stdout do 1 thread QueueListener riêng đảm nhận.
+Log của job đang chạy được gom trong bộ nhớ để lưu vào JobRun khi job kết thúc.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOGGER_NAMES = ("tools", "apps.youtube")
+# Số dòng log tối đa giữ lại cho mỗi job
+JOB_LOG_MAX_LINES = 500
+
+CONTEXT_FIELDS = ("job_id", "profile_id", "step")
+EXTRA_FIELDS = ("duration", "outcome", "retries", "error_class")
+
+_job_context = contextvars.ContextVar("youtube_job_context", default={})
+_job_buffers = {}
+_buffers_lock = threading.Lock()
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JobContextFilter(logging.Filter):
+    """Gắn job_id/profile_id/step của job đang chạy trên thread hiện tại vào record."""
+
+    def filter(self, record):
+        for key, value in _job_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": getattr(record, "thread_name", None) or record.threadName,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + EXTRA_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class JobLogBuffer(logging.Handler):
+    """Giữ log của từng job trong bộ nhớ (chỉ append vào list, không I/O)."""
+
+    def emit(self, record):
+        job_id = getattr(record, "job_id", None)
+        if not job_id:
+            return
+        with _buffers_lock:
+            lines = _job_buffers.get(job_id)
+            if lines is None or len(lines) >= JOB_LOG_MAX_LINES:
+                return
+        try:
+            lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(level=logging.INFO):
+    """
+    Gắn QueueHandler (JSON ra stdout qua thread QueueListener) và bộ đệm log theo job
+    cho logger của tool/app. Gọi nhiều lần chỉ cấu hình 1 lần.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(JobContextFilter())
+        buffer_handler = JobLogBuffer()
+        buffer_handler.addFilter(JobContextFilter())
+        buffer_handler.setFormatter(JsonFormatter())
+
+        for name in LOGGER_NAMES:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            logger.addHandler(queue_handler)
+            logger.addHandler(buffer_handler)
+            logger.propagate = False
+
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+@contextmanager
+def job_logging(job_id: str, profile_id: str):
+    """Đặt context job cho thread hiện tại và gom log của job; yield list các dòng log JSON."""
+    token = _job_context.set({"job_id": job_id, "profile_id": profile_id})
+    lines = []
+    with _buffers_lock:
+        _job_buffers[job_id] = lines
+    try:
+        yield lines
+    finally:
+        with _buffers_lock:
+            _job_buffers.pop(job_id, None)
+        _job_context.reset(token)
+
+
+def set_job_step(step: int):
+    """Cập nhật bước hiện tại trong context job (nếu thread đang chạy job)."""
+    context = _job_context.get()
+    if context:
+        _job_context.set({**context, "step": step})
@@ -0,0 +1,196 @@
+"""Metrics dạng Prometheus (text exposition format) cho job runner, không cần thư viện ngoài."""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tools.admission import admission
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Bucket (giây) mặc định cho các histogram độ trễ
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self):
+        """Các dòng (suffix, label values, extra labels, value) để render."""
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self._function is not None:
+            return [("", (), (), self._function())]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append(("_bucket", key, (("le", _format_value(bound)),), count))
+                samples.append(("_sum", key, (), total))
+                samples.append(("_count", key, (), counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra=()) -> str:
+        """Render toàn bộ metrics (kèm các metric tạm trong extra) theo text format của Prometheus."""
+        return "\n".join(metric.render() for metric in [*self._metrics, *extra]) + "\n"
+
+
+REGISTRY = Registry()
+
+JOBS_QUEUED = REGISTRY.register(Counter(
+    "youtube_jobs_queued_total", "Số job đã đưa vào hàng đợi"))
+JOBS_STARTED = REGISTRY.register(Counter(
+    "youtube_jobs_started_total", "Số job worker đã nhận chạy"))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "youtube_jobs_finished_total", "Số job đã kết thúc theo trạng thái và loại lỗi",
+    ["status", "error_class"]))
+JOBS_RETRIED = REGISTRY.register(Counter(
+    "youtube_jobs_retried_total", "Số lần job lỗi tạm thời được hẹn chạy lại", ["error_class"]))
+JOBS_RUNNING = REGISTRY.register(Gauge(
+    "youtube_jobs_running", "Số job đang chạy trong process"))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "youtube_job_queue_wait_seconds", "Thời gian job nằm trong hàng đợi trước khi được nhận",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+BROWSER_LAUNCHES = REGISTRY.register(Counter(
+    "youtube_browser_launches_total", "Số lần mở GPM profile + attach Selenium", ["outcome"]))
+BROWSER_SESSIONS = REGISTRY.register(Gauge(
+    "youtube_browser_sessions_active", "Số trình duyệt Chrome đang mở",
+    function=lambda: admission.active))
+BROWSER_LIMIT = REGISTRY.register(Gauge(
+    "youtube_browser_sessions_limit", "Giới hạn số trình duyệt hiện tại của admission control",
+    function=lambda: int(admission.limit)))
+STEP_DURATION = REGISTRY.register(Histogram(
+    "youtube_step_duration_seconds", "Thời gian từng bước của run_for_profile", ["step", "outcome"]))
+GPM_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "youtube_gpm_request_duration_seconds", "Độ trễ các request tới GPM API", ["endpoint", "outcome"]))
+DB_WRITE_DURATION = REGISTRY.register(Histogram(
+    "youtube_db_write_duration_seconds", "Độ trễ ghi DB", ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Phục vụ /metrics của process hiện tại (vd. process worker) trên addr:port ở thread nền."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
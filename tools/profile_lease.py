@@ -0,0 +1,167 @@
+"""
+Lease theo GPM profile dùng chung giữa các process (web, worker, CLI) qua bảng ProfileLease.
+Mỗi người cần profile thêm 1 dòng vào hàng đợi; dòng có id nhỏ nhất là người đang giữ, các dòng sau
+được tới lượt theo thứ tự. Dòng không được heartbeat quá LEASE_TIMEOUT (process chết) bị thu hồi.
+Không có Django (chạy tool độc lập) thì dùng hàng đợi trong process.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# Lease không được gia hạn quá chừng này giây thì coi như process giữ nó đã chết
+LEASE_TIMEOUT = int(os.environ.get("YOUTUBE_PROFILE_LEASE_TIMEOUT", 60))
+HEARTBEAT_INTERVAL = LEASE_TIMEOUT / 4
+# Chu kỳ kiểm tra lượt của người chờ ở process khác (cùng process thì được đánh thức ngay)
+POLL_INTERVAL = 0.5
+
+
+def _db_enabled() -> bool:
+    try:
+        from django.apps import apps
+    except ImportError:
+        return False
+    return apps.ready
+
+
+@dataclass
+class ProfileLeaseHandle:
+    gpm_id: str
+    ticket: object
+    local: bool = False
+
+
+class ProfileLeaseManager:
+    def __init__(self):
+        self._cond = threading.Condition()
+        # ticket id (DB) -> gpm_id của các lease đang giữ/chờ trong process, cần heartbeat
+        self._tickets = {}
+        # Hàng đợi trong process khi không có DB; profile hết người chờ thì xoá khỏi dict
+        self._local_queues = {}
+        self._heartbeat_thread = None
+
+    @staticmethod
+    def _holder() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def acquire(self, gpm_id: str, on_wait=None) -> ProfileLeaseHandle:
+        """Chờ tới lượt giữ profile (FIFO); phải chờ thì gọi on_wait(holder) mỗi khi người giữ thay đổi."""
+        if not _db_enabled():
+            return self._acquire_local(gpm_id, on_wait)
+
+        from apps.youtube.models import ProfileLease
+
+        ticket = self._enqueue(ProfileLease, gpm_id)
+        try:
+            waiting_for = None
+            while True:
+                head = self._head(ProfileLease, gpm_id)
+                if head is None or head.pk > ticket:
+                    # Dòng của mình bị thu hồi (heartbeat trễ quá lâu): xếp hàng lại
+                    logger.warning("⚠️ Lease chờ profile %s bị thu hồi, xếp hàng lại", gpm_id)
+                    self._forget(ticket)
+                    ticket = self._enqueue(ProfileLease, gpm_id)
+                    continue
+                if head.pk == ticket:
+                    break
+                if on_wait is not None and waiting_for != head.holder:
+                    waiting_for = head.holder
+                    on_wait(head.holder)
+                with self._cond:
+                    self._cond.wait(POLL_INTERVAL)
+        except BaseException:
+            self._release_ticket(ProfileLease, ticket)
+            raise
+
+        from django.utils import timezone
+        ProfileLease.objects.filter(pk=ticket).update(acquired_at=timezone.now())
+        return ProfileLeaseHandle(gpm_id, ticket)
+
+    def release(self, handle: ProfileLeaseHandle):
+        if handle.local:
+            self._release_local(handle)
+            return
+        from apps.youtube.models import ProfileLease
+        self._release_ticket(ProfileLease, handle.ticket)
+
+    def _enqueue(self, model, gpm_id: str) -> int:
+        from django.utils import timezone
+        ticket = model.objects.create(gpm_id=gpm_id, holder=self._holder(), heartbeat_at=timezone.now()).pk
+        with self._cond:
+            self._tickets[ticket] = gpm_id
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="profile-lease-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+        return ticket
+
+    @staticmethod
+    def _head(model, gpm_id: str):
+        """Người đang giữ profile (dòng id nhỏ nhất còn sống), thu hồi dòng quá hạn trước."""
+        from django.utils import timezone
+        stale = model.objects.filter(gpm_id=gpm_id, heartbeat_at__lt=timezone.now() - timedelta(seconds=LEASE_TIMEOUT))
+        for lease in stale:
+            logger.warning("♻️ Thu hồi lease quá hạn của profile %s (%s)", gpm_id, lease.holder)
+        stale.delete()
+        return model.objects.filter(gpm_id=gpm_id).order_by("id").only("id", "holder").first()
+
+    def _forget(self, ticket: int):
+        with self._cond:
+            self._tickets.pop(ticket, None)
+
+    def _release_ticket(self, model, ticket: int):
+        self._forget(ticket)
+        try:
+            model.objects.filter(pk=ticket).delete()
+        except Exception as e:  # không xoá được thì lease tự hết hạn sau LEASE_TIMEOUT
+            logger.warning("⚠️ Lỗi trả lease profile: %s", str(e).split("\n")[0])
+        with self._cond:
+            self._cond.notify_all()
+
+    def _heartbeat_loop(self):
+        from django.db import close_old_connections
+        from django.utils import timezone
+        from apps.youtube.models import ProfileLease
+
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._cond:
+                tickets = list(self._tickets)
+            if not tickets:
+                continue
+            try:
+                ProfileLease.objects.filter(pk__in=tickets).update(heartbeat_at=timezone.now())
+            except Exception as e:
+                logger.warning("⚠️ Lỗi gia hạn lease profile: %s", str(e).split("\n")[0])
+            finally:
+                close_old_connections()
+
+    def _acquire_local(self, gpm_id: str, on_wait=None) -> ProfileLeaseHandle:
+        ticket = object()
+        with self._cond:
+            queue = self._local_queues.setdefault(gpm_id, deque())
+            queue.append(ticket)
+            if queue[0] is not ticket and on_wait is not None:
+                on_wait("thread khác trong process")
+            while queue[0] is not ticket:
+                self._cond.wait()
+        return ProfileLeaseHandle(gpm_id, ticket, local=True)
+
+    def _release_local(self, handle: ProfileLeaseHandle):
+        with self._cond:
+            queue = self._local_queues.get(handle.gpm_id)
+            if queue is not None:
+                queue.remove(handle.ticket)
+                if not queue:
+                    del self._local_queues[handle.gpm_id]
+            self._cond.notify_all()
+
+
+profile_leases = ProfileLeaseManager()
@@ -223,6 +223,11 @@ navigations = [
                 "icon": "import_export",
                 "link": reverse_lazy("admin:youtube_importtoolproxy_changelist"),
             },
+            {
+                "title": _("Job Runs"),
+                "icon": "work_history",
+                "link": reverse_lazy("admin:youtube_jobrun_changelist"),
+            },
         ],
     },
     {
@@ -271,6 +276,19 @@ CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 ########################################################################
+# GPM
+########################################################################
+# Thời gian (giây) coi danh sách profile GPM trong cache là mới; quá hạn thì làm mới ngầm
+GPM_PROFILES_CACHE_TTL = int(environ.get("GPM_PROFILES_CACHE_TTL", 60))
+# Kết quả tìm kiếm của 1 keyword (từ job đã chạy) được coi là còn mới trong chừng này giây
+KEYWORD_RESULT_MAX_AGE = int(environ.get("KEYWORD_RESULT_MAX_AGE", 24 * 3600))
+# Giới hạn mềm số job đang chạy của 1 người upload: chạm giới hạn thì job của người khác được nhận trước,
+# không còn ai khác chờ thì vẫn nhận tiếp (0 = không giới hạn)
+YOUTUBE_MAX_RUNNING_PER_UPLOADER = int(environ.get("YOUTUBE_MAX_RUNNING_PER_UPLOADER", 4))
+# IP được scrape /metrics không cần đăng nhập (cách nhau dấu phẩy), mặc định chỉ staff.
+# Chạy sau reverse proxy thì mọi request đều tới từ 127.0.0.1, đừng thêm loopback vào đây.
+METRICS_ALLOWED_ADDRS = [addr.strip() for addr in environ.get("METRICS_ALLOWED_ADDRS", "").split(",") if addr.strip()]
+########################################################################
 # Timezone
 ########################################################################
 TIME_ZONE = environ.get("TIME_ZONE", "Asia/Ho_Chi_Minh")